@@ -1,23 +1,124 @@
 import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Server processes sharing port 5000 (SO_REUSEPORT). Event state, job status
+# and the leaderboard are shared through the DB, see event_state.py / jobs.py.
+# Settled before the backend modules below are imported: database.py, jobs.py,
+# events.py, leaderboard.py and sandbox.py read WEB_WORKERS from the environment.
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+if WEB_WORKERS > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+    print("WARNING: SO_REUSEPORT not supported here, running a single server process")
+    WEB_WORKERS = 1
+    os.environ['WEB_WORKERS'] = '1'
+
 from flask_cors import CORS
 from flask import Flask
 from model import db  
+from database import configure_database, migrate_schema
+from leaderboard import leaderboard
+from metrics import metrics
 from waitress import serve
 
 app = Flask(__name__)
 CORS(app)
 
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'event.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Request timing for /metrics (see metrics.py)
+metrics.init_app(app)
+
+# Request threads; the DB connection pool is sized to match
+WAITRESS_THREADS = int(os.environ.get('WAITRESS_THREADS', 16))
+
+IS_WORKER_PROCESS = os.environ.get('WEB_WORKER_PROCESS') == '1'
+PORT = int(os.environ.get('PORT', 5000))
+
+# SQLite in WAL mode, pragmas and pool sizing live in database.py
+configure_database(app, threads=WAITRESS_THREADS)
 
-db.init_app(app)
-    
+
+# Questions come from the packs in questions/, reloaded when they change (see registry.py)
+from registry import registry
+registry.init_app(app)
 
 from routes import bp
 app.register_blueprint(bp)
 
+# Background workers that run the sandbox jobs queued by /submit
+from jobs import submission_queue
+submission_queue.init_app(app)
+
+# Keeps this process' copy of the event status in step with the DB
+from event_state import event_state
+event_state.init_app(app)
+
+
+def listen_socket(port):
+    # Every worker binds its own socket to the same port; the kernel spreads connections over them
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('0.0.0.0', port))
+    return sock
+
+
+def run_workers():
+    """Starts WEB_WORKERS copies of this server and restarts any that die."""
+    env = dict(os.environ, WEB_WORKER_PROCESS='1')
+    def spawn():
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+    workers = [spawn() for _ in range(WEB_WORKERS)]
+    print(f"Started {WEB_WORKERS} server processes on port {PORT}")
+    try:
+        while True:
+            time.sleep(1)
+            for i, worker in enumerate(workers):
+                if worker.poll() is not None:
+                    print(f"WARNING: server process {worker.pid} exited ({worker.returncode}), restarting")
+                    workers[i] = spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
 if __name__ == '__main__':
+    if not IS_WORKER_PROCESS:
+        with app.app_context():
+            db.create_all()  # Create database tables for our data models
+            migrate_schema()  # Add indexes/constraints to an older event.db
+
+    if WEB_WORKERS > 1 and not IS_WORKER_PROCESS:
+        # Parent: fetch/pin/build the sandbox images and clean up after a previous run once, then just supervise
+        from sandbox import prepare_sandbox_images, remove_stale_sandboxes
+        prepare_sandbox_images()
+        remove_stale_sandboxes()
+        run_workers()
+        sys.exit(0)
+
     with app.app_context():
-        db.create_all()  # Create database tables for our data models
-    serve(app, host='0.0.0.0', port=5000, threads=16)
\ No newline at end of file
+        event_state.refresh()  # Event status from the DB
+        leaderboard.rebuild()  # Rank everyone already in the DB
+
+    # Sandbox startup runs next to the server: images are resolved/pulled/built
+    # (workers only look up what the parent prepared), then the pools are
+    # booted so the first submit doesn't pay for it. /ready is 503 until done.
+    from sandbox import prepare_sandbox_images, warm_pools
+    def start_sandbox():
+        prepare_sandbox_images(pull=not IS_WORKER_PROCESS)
+        warm_pools(clean=not IS_WORKER_PROCESS)
+    threading.Thread(target=start_sandbox, name="sandbox-startup", daemon=True).start()
+
+    # Pushes event status to browsers (SSE) from its own port and asyncio loop
+    from events import event_stream
+    event_stream.start()
+    if IS_WORKER_PROCESS:
+        serve(app, sockets=[listen_socket(PORT)], threads=WAITRESS_THREADS)
+    else:
+        serve(app, host='0.0.0.0', port=PORT, threads=WAITRESS_THREADS)
@@ -0,0 +1,98 @@
+"""
+Query benchmark for the UserProgress / ProbeLog indexes.
+
+Builds a throwaway SQLite DB with the real models, fills ProbeLog with N rows
+spread over many users and questions, and times the lookups /probe, /submit
+and /get_progress do - once without the indexes and once with them.
+
+Usage:
+  python bench_db.py                 # 10k and 100k rows
+  python bench_db.py --rows 10000 250000 --users 500
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text
+
+from model import db, UserProgress, ProbeLog
+
+INDEXES = ["uq_progress_user_question", "ix_probe_log_user_question_time"]
+QUESTION_IDS = list(range(1, 11))
+
+
+def build_db(path, rows, users):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(db.metadata.tables['user'].insert(),
+                     [{"id": u, "username": f"user{u}", "total_score": 0} for u in range(1, users + 1)])
+        conn.execute(UserProgress.__table__.insert(),
+                     [{"user_id": u, "question_id": q, "probes_used": 0}
+                      for u in range(1, users + 1) for q in QUESTION_IDS])
+        conn.execute(ProbeLog.__table__.insert(), [
+            {
+                "user_id": random.randint(1, users),
+                "question_id": random.choice(QUESTION_IDS),
+                "input_val": str(i),
+                "output_val": str(i * 2),
+                "timestamp": start + timedelta(seconds=i)
+            }
+            for i in range(rows)
+        ])
+    return engine
+
+
+def time_queries(engine, users, repeat):
+    lookups = [(random.randint(1, users), random.choice(QUESTION_IDS)) for _ in range(repeat)]
+    progress_q = select(UserProgress).where(UserProgress.user_id == text(":u"), UserProgress.question_id == text(":q"))
+    history_q = (select(ProbeLog)
+                 .where(ProbeLog.user_id == text(":u"), ProbeLog.question_id == text(":q"))
+                 .order_by(ProbeLog.timestamp.desc()))
+
+    results = {}
+    with engine.connect() as conn:
+        for name, query in (("progress lookup", progress_q), ("probe history", history_q)):
+            t0 = time.perf_counter()
+            for u, q in lookups:
+                conn.execute(query, {"u": u, "q": q}).all()
+            results[name] = (time.perf_counter() - t0) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark progress/probe-log queries with and without indexes")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="ProbeLog row counts")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=500, help="queries per measurement")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'query':<16} {'no index (ms)':>14} {'indexed (ms)':>13} {'speedup':>8}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = build_db(os.path.join(tmp, "bench.db"), rows, args.users)
+
+            with engine.begin() as conn:
+                for name in INDEXES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            without = time_queries(engine, args.users, args.repeat)
+
+            for table in (UserProgress.__table__, ProbeLog.__table__):
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
+            with_idx = time_queries(engine, args.users, args.repeat)
+            engine.dispose()
+
+        for name in without:
+            print(f"{rows:>8}  {name:<16} {without[name]:>14.3f} {with_idx[name]:>13.3f} "
+                  f"{without[name] / with_idx[name]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
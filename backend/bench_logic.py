@@ -0,0 +1,134 @@
+"""
+Equivalence check and microbenchmark for the fast question functions.
+
+The check calls the fast version (a pack's "fast" function, what probes
+use) and the reference version (its "func") on edge cases plus
+random inputs and requires identical answers: same values, same Python
+types, same JSON. Inputs come in random order, so the prefix tables get
+checked while they grow as well as after.
+
+The benchmark times each question for n = 10 .. 10^6 (capped at the
+question's max_input): the reference, the fast version with empty tables
+(cold) and with the table already built (warm).
+
+Usage:
+  python bench_logic.py                       # check, then benchmark
+  python bench_logic.py --check-only --samples 2000 --seed 7
+  python bench_logic.py --bench-only --sizes 10 1000 100000
+  FASTLOGIC_NUMPY=0 python bench_logic.py     # the same without numpy
+"""
+
+import argparse
+import json
+import random
+import time
+
+import fastlogic
+from registry import registry
+
+EDGE_INPUTS = list(range(-20, 130)) + [255, 256, 999, 1000, 1001, 1023, 1024, 1025, 4096, 9973, 10000]
+
+
+def questions():
+    registry.reload(raise_errors=True)
+    for question_id, config in registry.by_id.items():
+        if config["fast"] is not None:
+            yield question_id, config
+
+
+def same_answer(expected, actual):
+    if type(expected) is not type(actual) or json.dumps(expected) != json.dumps(actual):
+        return False
+    if isinstance(expected, list):
+        return all(type(a) is type(b) for a, b in zip(expected, actual))
+    return True
+
+
+def check(samples, max_n, seed):
+    rng = random.Random(seed)
+    failures = 0
+    for question_id, config in questions():
+        limit = min(config.get("max_input", max_n), max_n)
+        # Log-uniform sizes so big inputs show up without making the reference run forever
+        inputs = [n for n in EDGE_INPUTS if abs(n) <= limit]
+        inputs += [rng.choice((-1, 1)) * int(limit ** rng.random()) for _ in range(samples)]
+        rng.shuffle(inputs)
+
+        fastlogic.clear_tables()
+        start = time.perf_counter()
+        for n in inputs:
+            if not same_answer(config["reference"](n), config["func"](n)):
+                failures += 1
+                print(f"❌ Q{question_id} ({config['reference'].__name__}) differs for n={n}")
+                break
+        else:
+            print(f"✅ Q{question_id} ({config['reference'].__name__}): {len(inputs)} inputs up to {limit} agree "
+                  f"({time.perf_counter() - start:.1f}s)")
+    return failures
+
+
+def best_of(func, n, budget=0.2):
+    # Fastest of as many calls as fit in `budget` seconds (at least one)
+    best = float("inf")
+    deadline = time.perf_counter() + budget
+    while True:
+        t0 = time.perf_counter()
+        func(n)
+        best = min(best, time.perf_counter() - t0)
+        if time.perf_counter() > deadline:
+            return best
+
+
+def bench(sizes, ref_budget):
+    print(f"\nnumpy: {'yes' if fastlogic.np is not None else 'no'}")
+    print(f"{'question':<22} {'n':>9} {'reference (ms)':>15} {'cold (ms)':>11} {'warm (ms)':>11} {'speedup':>9}")
+    for question_id, config in questions():
+        reference, fast = config["reference"], config["func"]
+        reference_slow = False
+        for n in sizes:
+            if n > config.get("max_input", n):
+                continue
+
+            if reference_slow:
+                ref_ms = None
+            else:
+                t0 = time.perf_counter()
+                reference(n)
+                ref_ms = (time.perf_counter() - t0) * 1000
+                if ref_ms > ref_budget * 1000:
+                    reference_slow = True  # bigger n would only take longer
+                elif ref_ms < 50:
+                    ref_ms = best_of(reference, n) * 1000
+
+            fastlogic.clear_tables()
+            t0 = time.perf_counter()
+            fast(n)
+            cold_ms = (time.perf_counter() - t0) * 1000
+            warm_ms = best_of(fast, n) * 1000
+
+            ref_text = f"{ref_ms:>15.3f}" if ref_ms is not None else f"{'skipped':>15}"
+            speedup = f"{ref_ms / warm_ms:>8.0f}x" if ref_ms is not None and warm_ms else f"{'-':>9}"
+            print(f"{f'Q{question_id} {reference.__name__}':<22} {n:>9} {ref_text} {cold_ms:>11.3f} {warm_ms:>11.3f} {speedup}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the fast question functions")
+    parser.add_argument("--samples", type=int, default=300, help="random inputs per question for the check")
+    parser.add_argument("--max-n", type=int, default=100000, help="largest |n| the check uses")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000, 1000000])
+    parser.add_argument("--ref-budget", type=float, default=5.0,
+                        help="stop timing a reference once one call takes longer than this (s)")
+    parser.add_argument("--check-only", action="store_true")
+    parser.add_argument("--bench-only", action="store_true")
+    args = parser.parse_args()
+
+    if not args.bench_only:
+        if check(args.samples, args.max_n, args.seed):
+            raise SystemExit("🛑 fast and reference functions disagree")
+    if not args.check_only:
+        bench(args.sizes, args.ref_budget)
+
+
+if __name__ == "__main__":
+    main()
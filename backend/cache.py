@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe LRU cache where every entry also expires after `ttl` seconds.
+
+    Holds at most `maxsize` entries; inserting past that drops the least
+    recently used one. `ttl=None` means entries only leave through LRU.
+    With `max_weight`, the entries' `weigh(value)` must also add up to at
+    most that (LRU entries go first), and a value heavier than all of it is
+    not stored at all.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, max_weight=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh or (lambda value: 1)
+        self.weight = 0
+        self.data = OrderedDict()  # key -> (expires_at, value, weight)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.data.get(key, _MISSING)
+            if item is _MISSING or (item[0] is not None and item[0] < time.monotonic()):
+                if item is not _MISSING:
+                    del self.data[key]
+                    self.weight -= item[2]
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        weight = self.weigh(value)
+        with self.lock:
+            old = self.data.pop(key, _MISSING)
+            if old is not _MISSING:
+                self.weight -= old[2]
+            if self.max_weight is not None and weight > self.max_weight:
+                return
+            self.data[key] = (expires_at, value, weight)
+            self.weight += weight
+            while len(self.data) > self.maxsize or (self.max_weight is not None and self.weight > self.max_weight):
+                self.weight -= self.data.popitem(last=False)[1][2]
+
+    def pop(self, key, default=None):
+        with self.lock:
+            item = self.data.pop(key, _MISSING)
+            if item is not _MISSING:
+                self.weight -= item[2]
+        return default if item is _MISSING else item[1]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+# --- CACHE SETTINGS ---
+COMPILE_CACHE_DIR = os.environ.get('COMPILE_CACHE_DIR', os.path.join(basedir, '.compile_cache'))
+COMPILE_CACHE_MAX_MB = float(os.environ.get('COMPILE_CACHE_MAX_MB', 256))
+
+
+def cache_key(image, compile_cmd, full_code):
+    """Content address of a build: same compiler image + command + source = same binary."""
+    digest = hashlib.sha256()
+    for part in (image, compile_cmd, full_code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CompileCache:
+    """On-disk LRU cache of compiled binaries and compile errors.
+
+    Entries are `<key>.bin` (the executable) or `<key>.err` (the compiler's
+    output). Recency is kept in memory and mirrored into file mtimes, so the
+    LRU order survives a restart. When the total size goes over the cap the
+    least recently used entries are deleted.
+    """
+
+    def __init__(self, directory=COMPILE_CACHE_DIR, max_bytes=int(COMPILE_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # filename -> size, oldest first
+        self.total_bytes = 0
+        self.loaded = False
+
+    def _load(self):
+        # Rebuild the index from disk the first time the cache is used
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            if not (name.endswith('.bin') or name.endswith('.err')):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total_bytes += size
+        self.loaded = True
+
+    def get(self, key):
+        """Returns ('binary', bytes), ('error', str) or None on a miss."""
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            for name, kind in ((key + '.bin', 'binary'), (key + '.err', 'error')):
+                if name not in self.entries:
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    os.utime(path)
+                except OSError:
+                    # Deleted behind our back, forget it
+                    self.total_bytes -= self.entries.pop(name)
+                    return None
+                self.entries.move_to_end(name)
+                return (kind, data) if kind == 'binary' else (kind, data.decode('utf-8', errors='replace'))
+        return None
+
+    def put_binary(self, key, data):
+        self._put(key + '.bin', data)
+
+    def put_error(self, key, message):
+        self._put(key + '.err', message.encode('utf-8'))
+
+    def _put(self, name, data):
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            path = os.path.join(self.directory, name)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # readers never see a half-written binary
+
+            self.total_bytes -= self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+compile_cache = CompileCache()
@@ -0,0 +1,313 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from model import db, ProbeLog, UserProgress, EventState
+from metrics import metrics
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+# --- DB SETTINGS ---
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'event.db'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+# Group-commit ProbeLog inserts instead of one commit per probe (off by default)
+PROBE_LOG_WRITE_BEHIND = os.environ.get('PROBE_LOG_WRITE_BEHIND', '0') == '1'
+PROBE_LOG_FLUSH_MS = int(os.environ.get('PROBE_LOG_FLUSH_MS', 200))
+PROBE_LOG_BATCH = int(os.environ.get('PROBE_LOG_BATCH', 200))
+
+# Resets move the old DB file here instead of deleting rows
+DB_ARCHIVE_DIR = os.environ.get('DB_ARCHIVE_DIR', os.path.join(basedir, 'archive'))
+RESET_DRAIN_SEC = float(os.environ.get('RESET_DRAIN_SEC', 5))  # max wait for in-flight queries before a swap
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers carry on while one thread writes, NORMAL is safe with WAL,
+    # and busy_timeout makes writers wait for the lock instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def configure_database(app, threads):
+    """Points the app at the DB and sizes the connection pool to the server threads."""
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        # One connection per request thread, plus a few for the background workers
+        'pool_size': threads,
+        'max_overflow': 8,
+        'pool_timeout': 30,
+        'pool_pre_ping': False,
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000} if DATABASE_URL.startswith('sqlite') else {}
+    }
+
+    db.init_app(app)
+
+    if DATABASE_URL.startswith('sqlite'):
+        with app.app_context():
+            event.listen(db.engine, "connect", _set_sqlite_pragmas)
+            event.listen(db.engine, "do_connect", _wait_for_swap)
+
+    with app.app_context():
+        metrics.instrument_engine(db.engine)
+
+    probe_log_buffer.init_app(app)
+
+
+# --- SCHEMA MIGRATIONS ---
+# create_all() only creates missing tables, it never touches existing ones.
+# These steps bring an older event.db up to date; each runs once per file and
+# the number of applied steps is kept in SQLite's `PRAGMA user_version`.
+def _add_progress_unique_index(conn):
+    # Races in the old create-if-missing path could leave duplicate rows.
+    # Keep the oldest row per (user, question) with the best values of the group.
+    conn.exec_driver_sql("""
+        UPDATE user_progress SET
+            probes_used = (SELECT MAX(p.probes_used) FROM user_progress p
+                           WHERE p.user_id = user_progress.user_id AND p.question_id = user_progress.question_id),
+            tests_passed = (SELECT MAX(p.tests_passed) FROM user_progress p
+                            WHERE p.user_id = user_progress.user_id AND p.question_id = user_progress.question_id),
+            score_earned = (SELECT MAX(p.score_earned) FROM user_progress p
+                            WHERE p.user_id = user_progress.user_id AND p.question_id = user_progress.question_id),
+            is_solved = (SELECT MAX(p.is_solved) FROM user_progress p
+                         WHERE p.user_id = user_progress.user_id AND p.question_id = user_progress.question_id),
+            solved_at = (SELECT MAX(p.solved_at) FROM user_progress p
+                         WHERE p.user_id = user_progress.user_id AND p.question_id = user_progress.question_id)
+        WHERE id IN (SELECT MIN(id) FROM user_progress GROUP BY user_id, question_id HAVING COUNT(*) > 1)
+    """)
+    conn.exec_driver_sql("""
+        DELETE FROM user_progress
+        WHERE id NOT IN (SELECT MIN(id) FROM user_progress GROUP BY user_id, question_id)
+    """)
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_progress_user_question ON user_progress (user_id, question_id)")
+
+
+def _add_probe_log_index(conn):
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_probe_log_user_question_time ON probe_log (user_id, question_id, timestamp)")
+
+
+MIGRATIONS = [
+    _add_progress_unique_index,
+    _add_probe_log_index,
+]
+
+
+def migrate_schema():
+    """Applies pending MIGRATIONS. Call inside an app context, after db.create_all()."""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            print(f"Migrating event DB to schema v{number} ({step.__name__})")
+            step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+
+
+# --- FAST RESET (swap the DB file) ---
+# New connections wait on this while archive_database() swaps the file
+_connect_gate = threading.Event()
+_connect_gate.set()
+
+
+def _wait_for_swap(dialect, conn_rec, cargs, cparams):
+    _connect_gate.wait()
+
+
+def _build_fresh_db(path, state):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {len(MIGRATIONS)}")  # indexes are already in create_all
+        if state:
+            conn.execute(insert(EventState), [state])  # keep the state version going up
+    engine.dispose()
+
+
+def archive_database():
+    """Moves the live DB file into DB_ARCHIVE_DIR and puts an empty one in its place.
+
+    Takes milliseconds however big the DB is, and the old round stays around
+    as a normal SQLite file for analysis. Returns the archive path, or None
+    if it can't be done here - not a file DB, several server processes
+    (their connections can't be closed from here), or queries still running
+    after RESET_DRAIN_SEC. Callers then clear the tables the slow way.
+    Call with no connection checked out by the caller (db.session.close()).
+    """
+    path = db.engine.url.database
+    if db.engine.dialect.name != 'sqlite' or not path or path == ':memory:' or WEB_WORKERS > 1:
+        return None
+
+    os.makedirs(DB_ARCHIVE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    archive_path = os.path.join(DB_ARCHIVE_DIR, f"event-{stamp}.db")
+    fresh_path = f"{path}.fresh"
+
+    # 1. Hold new connections and drop the idle ones
+    _connect_gate.clear()
+    try:
+        old_pool = db.engine.pool
+        db.engine.dispose()
+
+        # 2. Let queries that are already running finish
+        deadline = time.monotonic() + RESET_DRAIN_SEC
+        while old_pool.checkedout() > 0:
+            if time.monotonic() > deadline:
+                print("WARNING: DB still busy, resetting by deleting rows instead")
+                return None
+            time.sleep(0.005)
+        old_pool.dispose()  # closing the last connection checkpoints and removes the -wal file
+
+        # 3. Fresh file next to the old one (same filesystem, so the renames are atomic)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM event_state WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            row = None  # DB from before event_state existed
+        finally:
+            conn.close()
+        _build_fresh_db(fresh_path, dict(row) if row else None)
+
+        # 4. Swap (side files normally went away with the last connection, but never leave them for the new file)
+        os.replace(path, archive_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.replace(path + suffix, archive_path + suffix)
+        os.replace(fresh_path, path)
+        return archive_path
+    finally:
+        if os.path.exists(fresh_path):
+            os.remove(fresh_path)
+        _connect_gate.set()
+
+
+def ensure_progress(user_id, question_id):
+    """Returns the (user, question) progress row, creating it first if needed.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING against the unique index, so two
+    concurrent requests can't both create a row.
+    """
+    db.session.execute(
+        sqlite_insert(UserProgress)
+        .values(user_id=user_id, question_id=question_id, probes_used=0,
+                tests_passed=0, is_solved=False, score_earned=0)
+        .on_conflict_do_nothing(index_elements=['user_id', 'question_id'])
+    )
+    return UserProgress.query.filter_by(user_id=user_id, question_id=question_id).one()
+
+
+def reserve_probe(user_id, question_id, max_probes):
+    """Atomically uses up one probe and returns the new probes_used, or None if none are left.
+
+    A single upsert: the first probe inserts the progress row with
+    probes_used=1, later ones increment it only while it's below max_probes.
+    No read-modify-write, so parallel probes can't go over the quota.
+    """
+    if max_probes < 1:
+        return None
+    stmt = (
+        sqlite_insert(UserProgress)
+        .values(user_id=user_id, question_id=question_id, probes_used=1,
+                tests_passed=0, is_solved=False, score_earned=0)
+        .on_conflict_do_update(
+            index_elements=['user_id', 'question_id'],
+            set_={'probes_used': UserProgress.probes_used + 1},
+            where=UserProgress.probes_used < max_probes
+        )
+        .returning(UserProgress.probes_used)
+    )
+    return db.session.execute(stmt).scalar()
+
+
+def refund_probe(user_id, question_id):
+    """Gives back a probe reserved by reserve_probe (its evaluation failed)."""
+    db.session.query(UserProgress).filter(
+        UserProgress.user_id == user_id, UserProgress.question_id == question_id,
+        UserProgress.probes_used > 0
+    ).update({UserProgress.probes_used: UserProgress.probes_used - 1}, synchronize_session=False)
+
+
+class ProbeLogBuffer:
+    """Write-behind buffer that group-commits ProbeLog rows.
+
+    With write-behind enabled /probe only commits the probes_used counter
+    synchronously; its history row is queued here and inserted together with
+    other probes' rows every PROBE_LOG_FLUSH_MS (or once PROBE_LOG_BATCH rows
+    pile up). Disabled, `add` simply adds the row to the current session.
+    """
+
+    def __init__(self, enabled=PROBE_LOG_WRITE_BEHIND):
+        self.enabled = enabled
+        self.rows = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        if self.enabled:
+            threading.Thread(target=self._flush_loop, name="probe-log-writer", daemon=True).start()
+            atexit.register(self.flush)
+
+    def add(self, user_id, question_id, input_val, output_val):
+        if not self.enabled:
+            db.session.add(ProbeLog(user_id=user_id, question_id=question_id,
+                                    input_val=input_val, output_val=output_val))
+            return
+
+        row = {
+            "user_id": user_id,
+            "question_id": question_id,
+            "input_val": input_val,
+            "output_val": output_val,
+            "timestamp": datetime.utcnow()  # time of the probe, not of the flush
+        }
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= PROBE_LOG_BATCH:
+                self.wakeup.set()
+
+    def flush(self):
+        """Writes everything queued so far. Safe to call from any thread."""
+        if not self.enabled:
+            return
+        with self.flush_lock:
+            with self.lock:
+                rows, self.rows = self.rows, []
+            if not rows:
+                return
+            with self.app.app_context():
+                try:
+                    db.session.execute(insert(ProbeLog), rows)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"🛑 PROBE LOG FLUSH FAILED ({len(rows)} rows): {e}")
+
+    def discard(self):
+        with self.lock:
+            self.rows = []
+
+    def _flush_loop(self):
+        while True:
+            self.wakeup.wait(PROBE_LOG_FLUSH_MS / 1000)
+            self.wakeup.clear()
+            self.flush()
+
+
+probe_log_buffer = ProbeLogBuffer()
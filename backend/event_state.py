@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from model import db, EventState
+
+# How often every process checks the shared row for changes made by another process
+EVENT_STATE_REFRESH_MS = int(os.environ.get('EVENT_STATE_REFRESH_MS', 500))
+
+STATE_COLUMNS = list(EventState.__table__.c)
+
+
+class EventStateStore:
+    """Event status (ended / top 5 / tie breaker) kept in the DB, cached per process.
+
+    Requests read the in-memory copy, so checking status costs nothing.
+    `set()` writes the shared row and bumps its version; a background thread
+    in every process compares versions (one tiny indexed SELECT) every
+    EVENT_STATE_REFRESH_MS and reloads when another process changed it.
+    Functions registered with `on_change` run after every change, local or
+    remote.
+    """
+
+    def __init__(self):
+        self.ended = False
+        self.top5 = []
+        self.tie_breaker = False
+        self.version = 0
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.app = None
+        self.last_error = None
+
+    def init_app(self, app):
+        self.app = app
+        threading.Thread(target=self._refresh_loop, name="event-state-refresh", daemon=True).start()
+
+    def on_change(self, func):
+        self.listeners.append(func)
+        return func
+
+    def snapshot(self):
+        with self.lock:
+            return {"ended": self.ended, "top5": self.top5, "tie_breaker": self.tie_breaker}
+
+    def _apply(self, row):
+        with self.lock:
+            if row.version <= self.version:  # already have this (or a newer) state
+                return False
+            self.ended = bool(row.ended)
+            self.top5 = json.loads(row.top5 or '[]')
+            self.tie_breaker = bool(row.tie_breaker)
+            self.version = row.version
+        for listener in self.listeners:
+            listener()
+        return True
+
+    def set(self, **changes):
+        """Changes the state for every process and applies it here right away."""
+        if 'top5' in changes:
+            changes['top5'] = json.dumps(changes['top5'])
+        # One upsert: creates the row on first use, otherwise applies the changes and bumps the version
+        values = {"ended": False, "top5": '[]', "tie_breaker": False, **changes}
+        row = db.session.execute(
+            sqlite_insert(EventState)
+            .values(id=1, version=1, **values)
+            .on_conflict_do_update(index_elements=['id'],
+                                   set_={**changes, 'version': EventState.version + 1})
+            .returning(*STATE_COLUMNS)
+        ).one()
+        db.session.commit()
+        self._apply(row)
+
+    def refresh(self):
+        """Reloads the state if another process changed it. Call inside an app context."""
+        version = db.session.execute(select(EventState.version).where(EventState.id == 1)).scalar()
+        if version is None or version <= self.version:
+            return
+        row = db.session.execute(select(*STATE_COLUMNS).where(EventState.id == 1)).one()
+        self._apply(row)
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(EVENT_STATE_REFRESH_MS / 1000)
+            with self.app.app_context():
+                try:
+                    self.refresh()
+                    self.last_error = None
+                except Exception as e:
+                    db.session.rollback()
+                    # e.g. tables not created yet; say it once, not twice a second
+                    if str(e) != self.last_error:
+                        print(f"WARNING: could not refresh event state: {e}")
+                        self.last_error = str(e)
+
+
+event_state = EventStateStore()
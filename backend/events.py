@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import threading
+
+# --- EVENT STREAM SETTINGS ---
+# Server-Sent Events run on their own port from a single asyncio loop, so an
+# idle browser costs a socket and a small coroutine, not a waitress thread.
+EVENTS_HOST = os.environ.get('EVENTS_HOST', '0.0.0.0')
+EVENTS_PORT = int(os.environ.get('EVENTS_PORT', 5001))  # 0 disables the stream
+EVENTS_HEARTBEAT_SEC = int(os.environ.get('EVENTS_HEARTBEAT_SEC', 15))
+EVENTS_REUSE_PORT = int(os.environ.get('WEB_WORKERS', 1)) > 1  # every worker process serves its own share
+EVENTS_CLIENT_BACKLOG = 8  # messages queued per slow client before old ones are dropped
+
+RESPONSE_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/event-stream\r\n"
+    "Cache-Control: no-cache\r\n"
+    "Connection: keep-alive\r\n"
+    "Access-Control-Allow-Origin: *\r\n"
+    "X-Accel-Buffering: no\r\n"
+    "\r\n"
+).encode()
+
+NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+class EventStream:
+    """Fans event-state changes out to every connected browser over SSE.
+
+    `publish()` is safe to call from any thread (request handlers, workers);
+    it hands the message to the stream's loop, which puts it on each
+    client's queue. New clients get the latest message right away.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.clients = set()
+        self.last = None
+        self.started = threading.Event()
+
+    def start(self, host=EVENTS_HOST, port=EVENTS_PORT):
+        if port <= 0 or self.started.is_set():
+            return
+        threading.Thread(target=asyncio.run, args=(self._serve(host, port),),
+                         name="event-stream", daemon=True).start()
+        self.started.wait(5)
+
+    def publish(self, data):
+        message = f"data: {json.dumps(data)}\n\n".encode()
+        if self.loop is None:
+            self.last = message  # not started (yet), just remember it
+            return
+        self.loop.call_soon_threadsafe(self._broadcast, message, True)
+
+    def _broadcast(self, message, remember=False):
+        if remember:
+            self.last = message
+        for queue in self.clients:
+            if queue.full():
+                queue.get_nowait()  # client isn't keeping up, drop its oldest message
+            queue.put_nowait(message)
+
+    async def _serve(self, host, port):
+        self.loop = asyncio.get_running_loop()
+        try:
+            server = await asyncio.start_server(self._handle, host, port, reuse_port=EVENTS_REUSE_PORT or None)
+        except OSError as e:
+            print(f"WARNING: Event stream not started on port {port}: {e}")
+            self.started.set()
+            return
+        print(f"Event stream listening on {host}:{port}/events")
+        self.started.set()
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._heartbeat())
+
+    async def _heartbeat(self):
+        # Comment lines keep proxies from closing idle streams and flush out dead clients
+        while True:
+            await asyncio.sleep(EVENTS_HEARTBEAT_SEC)
+            self._broadcast(b": ping\n\n")
+
+    async def _handle(self, reader, writer):
+        queue = None
+        try:
+            # 1. Minimal HTTP: we only care about the request line, skip the headers
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != "GET" or parts[1].split('?')[0] != "/events":
+                writer.write(NOT_FOUND)
+                await writer.drain()
+                return
+
+            # 2. Open the stream and send the current state
+            writer.write(RESPONSE_HEADERS + b"retry: 3000\n\n" + (self.last or b""))
+            await writer.drain()
+
+            # 3. Forward everything published until the client goes away
+            queue = asyncio.Queue(EVENTS_CLIENT_BACKLOG)
+            self.clients.add(queue)
+            while True:
+                writer.write(await queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            if queue is not None:
+                self.clients.discard(queue)
+            writer.close()
+
+
+event_stream = EventStream()
@@ -0,0 +1,182 @@
+import os
+import threading
+from bisect import bisect_left
+from itertools import accumulate
+
+# numpy is optional: with it the tables are built vectorised, without it
+# with plain Python. Either way the answers are lists of Python ints,
+# exactly what the reference functions in logic.py return.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if os.environ.get('FASTLOGIC_NUMPY', '1') != '1':
+    np = None
+
+# int64 holds (n-1)**3 up to about this n (hard1); above it we stay in Python ints
+NUMPY_CUBE_LIMIT = 2_000_000
+
+
+# --- PREFIX TABLES ---
+class PrefixTable:
+    """The first `size` terms of a sequence, grown on demand.
+
+    Every sequence question is prefix-closed (the answer for n is the first
+    n terms of the answer for any bigger n), so a probe is a slice of one
+    shared table instead of a fresh loop. The table at least doubles when it
+    grows, so a run of rising n rebuilds it O(log n) times.
+    """
+
+    def __init__(self, build):
+        self.build = build  # size -> list of the first `size` terms
+        self.terms = []
+        self.lock = threading.Lock()
+
+    def first(self, n):
+        terms = self.terms
+        if n > len(terms):
+            with self.lock:
+                terms = self.terms
+                if n > len(terms):
+                    terms = self.terms = self.build(max(n, 2 * len(terms), 64))
+        return terms[:max(n, 0)]
+
+    def clear(self):
+        with self.lock:
+            self.terms = []
+
+
+def _fibonacci(size):
+    terms = []
+    a, b = 0, 1
+    for _ in range(size):
+        terms.append(a)
+        a, b = b, a + b
+    return terms
+
+
+def _triangular(size):
+    if np is not None:
+        return np.cumsum(np.arange(1, size + 1, dtype=np.int64)).tolist()
+    return list(accumulate(range(1, size + 1)))
+
+
+def _squares_and_cubes(size):
+    if np is not None and size <= NUMPY_CUBE_LIMIT:
+        i = np.arange(size, dtype=np.int64)
+        return np.where(i % 2 == 0, i * i, i * i * i).tolist()
+    return [i * i if i % 2 == 0 else i * i * i for i in range(size)]
+
+
+def _double_or_add(size):
+    # Doubles every other step, so the terms outgrow int64 quickly: Python ints only
+    terms = [1]
+    value = 1
+    for i in range(1, size):
+        if i % 2 == 1:
+            value *= 2
+        else:
+            value += i
+        terms.append(value)
+    return terms
+
+
+def _negate_fives(size):
+    if np is not None:
+        i = np.arange(1, size + 1, dtype=np.int64)
+        has_five = np.zeros(size, dtype=bool)
+        rest = i.copy()
+        while rest.any():
+            has_five |= rest % 10 == 5
+            rest //= 10
+        return np.where(has_five, -i, i).tolist()
+    return [-i if '5' in str(i) else i for i in range(1, size + 1)]
+
+
+def _primes(size):
+    # Sieve of Eratosthenes: all primes below `size` (this table is indexed by value, not count)
+    if size < 3:
+        return []
+    if np is not None:
+        sieve = np.ones(size, dtype=bool)
+        sieve[:2] = False
+        for i in range(2, int(size ** 0.5) + 1):
+            if sieve[i]:
+                sieve[i * i::i] = False
+        return np.flatnonzero(sieve).tolist()
+    sieve = bytearray([1]) * size
+    sieve[0] = sieve[1] = 0
+    for i in range(2, int(size ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, size, i)))
+    return [i for i, is_prime in enumerate(sieve) if is_prime]
+
+
+FIBONACCI = PrefixTable(_fibonacci)
+TRIANGULAR = PrefixTable(_triangular)
+SQUARES_AND_CUBES = PrefixTable(_squares_and_cubes)
+DOUBLE_OR_ADD = PrefixTable(_double_or_add)
+NEGATE_FIVES = PrefixTable(_negate_fives)
+
+
+class PrimeTable:
+    """Primes below a limit from one sieve, regrown (doubled) when a bigger limit is asked for."""
+
+    def __init__(self):
+        self.limit = 0
+        self.primes = []
+        self.lock = threading.Lock()
+
+    def below(self, n):
+        if n > self.limit:
+            with self.lock:
+                if n > self.limit:
+                    limit = max(n, 2 * self.limit, 1024)
+                    self.primes = _primes(limit)
+                    self.limit = limit
+        primes = self.primes
+        return primes[:bisect_left(primes, n)]
+
+    def clear(self):
+        with self.lock:
+            self.limit = 0
+            self.primes = []
+
+
+PRIMES = PrimeTable()
+TABLES = [FIBONACCI, TRIANGULAR, SQUARES_AND_CUBES, DOUBLE_OR_ADD, NEGATE_FIVES, PRIMES]
+
+
+def clear_tables():
+    """Drops every table (they regrow on the next call). For benchmarks."""
+    for table in TABLES:
+        table.clear()
+
+
+# --- FAST REFERENCE FUNCTIONS (same answers as logic.py) ---
+# Only the sequence questions: the digit ones are O(digits) already.
+# The question packs point at them as "fast": "fastlogic:med1" (see registry.py)
+def med1(n):
+    return FIBONACCI.first(n)
+
+
+def med2(n):
+    return PRIMES.below(n)
+
+
+def med3(n):
+    return TRIANGULAR.first(n)
+
+
+def hard1(n):
+    return SQUARES_AND_CUBES.first(n)
+
+
+def hard2(n):
+    # The reference always starts with 1, even for n <= 1
+    return DOUBLE_OR_ADD.first(n) if n > 1 else [1]
+
+
+def hard3(n):
+    return NEGATE_FIVES.first(n)
@@ -0,0 +1,162 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+
+import docker
+
+# --- IMAGE SETTINGS ---
+# Sandbox images are resolved once at startup, never per submit. The first
+# resolve of a base tag records its digest and image id in IMAGE_LOCK_FILE;
+# after that only that exact image is used, so `gcc:latest` can't change
+# between (or during) events. Commit the lock file to keep the pin.
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_LOCK_FILE = os.environ.get('SANDBOX_IMAGE_LOCK', os.path.join(BACKEND_DIR, 'sandbox_images.lock.json'))
+# For offline venues: `docker save -o sandbox_images.tar python:3.9-slim gcc:latest` on a connected machine
+IMAGE_TARBALL = os.environ.get('SANDBOX_IMAGE_TARBALL', os.path.join(BACKEND_DIR, 'sandbox_images.tar'))
+IMAGE_PULL = os.environ.get('SANDBOX_IMAGE_PULL', '1') == '1'  # 0 = never go to the registry
+
+IMAGE_LABEL = "blackbox.sandbox.image"
+HARNESS_DIR = "/opt/blackbox"
+
+
+class ImageSpec:
+    """A sandbox image: a pinned base plus harness files baked in under HARNESS_DIR."""
+
+    def __init__(self, base, files):
+        self.base = base
+        self.files = files  # file name -> text
+
+
+def _read_lock():
+    try:
+        with open(IMAGE_LOCK_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"WARNING: ignoring unreadable image lock {IMAGE_LOCK_FILE}: {e}")
+        return {}
+
+
+def _write_lock(lock):
+    tmp = IMAGE_LOCK_FILE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(lock, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, IMAGE_LOCK_FILE)
+
+
+def _local(client, ref):
+    try:
+        return client.images.get(ref)
+    except docker.errors.ImageNotFound:
+        return None
+
+
+def _repo_digest(image, ref):
+    # "python:3.9-slim" -> the "python@sha256:..." entry of the pulled image
+    repo = ref.rsplit(':', 1)[0] if ':' in ref.rsplit('/', 1)[-1] else ref
+    for digest in image.attrs.get('RepoDigests') or []:
+        if digest.split('@', 1)[0] == repo:
+            return digest
+    return None
+
+
+class ImageResolver:
+    """Turns ImageSpecs into local, ready-to-run image tags (see prepare)."""
+
+    def __init__(self, client, pull=IMAGE_PULL):
+        self.client = client
+        self.pull = pull
+        self.lock = _read_lock()
+        self.tarball_loaded = False
+
+    def _load_tarball(self):
+        if self.tarball_loaded or not os.path.exists(IMAGE_TARBALL):
+            return False
+        self.tarball_loaded = True
+        print(f"Loading sandbox images from {IMAGE_TARBALL}...")
+        with open(IMAGE_TARBALL, 'rb') as f:
+            self.client.images.load(f)  # streamed, the archive can be over a GB
+        return True
+
+    def _find(self, ref, pin):
+        # Content-addressed id first: it survives docker save/load, digests don't always
+        for candidate in ([pin.get('id'), pin.get('digest')] if pin else [ref]):
+            if candidate:
+                image = _local(self.client, candidate)
+                if image is not None:
+                    return image
+        return None
+
+    def resolve_base(self, ref):
+        """Returns the local base image for `ref`, loading or pulling it if needed, and pins it."""
+        pin = self.lock.get(ref)
+        image = self._find(ref, pin)
+        if image is None and self._load_tarball():
+            image = self._find(ref, pin)
+        if image is None and self.pull:
+            source = pin.get('digest') if pin and pin.get('digest') else ref
+            print(f"Downloading {source}...")
+            image = self.client.images.pull(source)
+        if image is None:
+            raise RuntimeError(f"{ref} is not available locally and pulling is disabled")
+
+        if pin and pin.get('id') and image.id != pin['id']:
+            raise RuntimeError(f"{ref} resolved to {image.id}, but {IMAGE_LOCK_FILE} pins {pin['id']}")
+        if not pin:
+            self.lock[ref] = {"digest": _repo_digest(image, ref), "id": image.id}
+            print(f"Pinned {ref} to {self.lock[ref]['digest'] or image.id}")
+        return image
+
+    def build(self, name, spec):
+        """Builds (or reuses) `blackbox-sandbox-<name>:<hash>` on top of the pinned base."""
+        base = self.resolve_base(spec.base)
+
+        digest = hashlib.sha256(base.id.encode('utf-8'))
+        for filename in sorted(spec.files):
+            digest.update(filename.encode('utf-8') + b"\0" + spec.files[filename].encode('utf-8') + b"\0")
+        tag = f"blackbox-sandbox-{name}:{digest.hexdigest()[:12]}"
+        if _local(self.client, tag) is not None:
+            return tag
+
+        # Tag the base locally so FROM can't resolve to anything else (and needs no registry)
+        base_tag = f"blackbox-base-{name}:{base.id.split(':')[-1][:12]}"
+        base.tag(*base_tag.split(':'))
+
+        dockerfile = f"FROM {base_tag}\nCOPY harness/ {HARNESS_DIR}/\n"
+        context = io.BytesIO()
+        with tarfile.open(fileobj=context, mode='w') as tar:
+            files = {"Dockerfile": dockerfile, **{f"harness/{n}": text for n, text in spec.files.items()}}
+            for filename, text in files.items():
+                data = text.encode('utf-8')
+                info = tarfile.TarInfo(filename)
+                info.size = len(data)
+                info.mode = 0o644
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+        context.seek(0)
+
+        print(f"Building {tag} from {spec.base}...")
+        self.client.images.build(fileobj=context, custom_context=True, tag=tag, pull=False, rm=True,
+                                 labels={IMAGE_LABEL: name})
+        return tag
+
+    def prepare(self, specs):
+        """Returns {name: image tag} for every spec that could be made ready."""
+        ready = {}
+        before = json.dumps(self.lock, sort_keys=True)
+        for name, spec in specs.items():
+            try:
+                ready[name] = self.build(name, spec)
+            except Exception as e:
+                print(f"🛑 SANDBOX IMAGE FAILURE ({spec.base}): {e}")
+        if json.dumps(self.lock, sort_keys=True) != before:
+            try:
+                _write_lock(self.lock)
+            except OSError as e:
+                print(f"WARNING: could not write {IMAGE_LOCK_FILE}: {e}")
+        return ready
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from model import db, SubmissionJob
+from metrics import metrics
+
+# --- QUEUE SETTINGS ---
+SUBMIT_WORKERS = int(os.environ.get('SUBMIT_WORKERS', 4))         # sandbox jobs running at once
+SUBMIT_QUEUE_MAX = int(os.environ.get('SUBMIT_QUEUE_MAX', 64))    # queued jobs before we say "busy"
+SUBMIT_MAX_PER_USER = int(os.environ.get('SUBMIT_MAX_PER_USER', 2))
+JOB_RETENTION_SEC = float(os.environ.get('JOB_RETENTION_SEC', 600))  # how long finished results stay pollable
+
+# With several worker processes a status poll can land on a process that
+# didn't take the job, so job status is mirrored into the DB as well
+SHARED_JOB_STATUS = int(os.environ.get('WEB_WORKERS', 1)) > 1
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, user_key, func, args):
+        self.id = uuid.uuid4().hex
+        self.user_key = user_key
+        self.func = func
+        self.args = args
+        self.state = 'queued'  # queued -> running -> done / failed (error answer or crash)
+        self.result = None
+        self.http_status = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.state}
+        if self.done.is_set():
+            data["result"] = self.result
+            data["http_status"] = self.http_status
+        return data
+
+
+class SubmissionQueue:
+    """Runs sandbox jobs on a small, fixed set of worker threads.
+
+    Jobs are queued per user and workers take them round-robin across users,
+    so one participant spamming Submit can't push everybody else back.
+    `submit` raises QueueFull instead of blocking when we're at capacity.
+    """
+
+    def __init__(self, workers=SUBMIT_WORKERS, max_pending=SUBMIT_QUEUE_MAX, max_per_user=SUBMIT_MAX_PER_USER):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+        self.cond = threading.Condition()
+        self.user_queues = OrderedDict()  # user_key -> deque of queued jobs
+        self.active = {}  # user_key -> queued + running job count
+        self.pending = 0
+        self.jobs = {}
+        self.app = None
+        self.threads = []
+
+    def init_app(self, app):
+        self.app = app
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"submit-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, user_key, func, *args):
+        job = Job(user_key, func, args)
+        with self.cond:
+            self._purge_finished()
+            if self.active.get(user_key, 0) >= self.max_per_user:
+                raise QueueFull("You already have a submission running. Wait for its result.")
+            if self.pending >= self.max_pending:
+                raise QueueFull("Judge is busy right now. Try again in a few seconds.")
+
+            self.user_queues.setdefault(user_key, deque()).append(job)
+            self.active[user_key] = self.active.get(user_key, 0) + 1
+            self.pending += 1
+            self.jobs[job.id] = job
+            self.cond.notify()
+        self._store(job, overwrite=False)  # never clobber a result the worker already wrote
+        return job
+
+    def get(self, job_id):
+        with self.cond:
+            return self.jobs.get(job_id)
+
+    def lookup(self, job_id):
+        """Status of a job taken by another process (SHARED_JOB_STATUS only), or None."""
+        if not SHARED_JOB_STATUS:
+            return None
+        row = db.session.get(SubmissionJob, job_id, populate_existing=True)
+        if row is None:
+            return None
+        data = {"job_id": row.id, "status": row.state}
+        if row.result is not None:
+            data["result"] = json.loads(row.result)
+            data["http_status"] = row.http_status
+        return data
+
+    def _store(self, job, overwrite=True):
+        if not SHARED_JOB_STATUS:
+            return
+        # Own app context = own session, so this never commits a request's pending changes
+        with self.app.app_context():
+            try:
+                values = {"state": job.state, "http_status": job.http_status,
+                          "result": json.dumps(job.result) if job.done.is_set() else None,
+                          "updated_at": datetime.utcnow()}
+                stmt = sqlite_insert(SubmissionJob).values(id=job.id, **values)
+                if overwrite:
+                    stmt = stmt.on_conflict_do_update(index_elements=['id'], set_=values)
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=['id'])
+                db.session.execute(stmt)
+                if overwrite:
+                    cutoff = datetime.utcnow() - timedelta(seconds=JOB_RETENTION_SEC)
+                    SubmissionJob.query.filter(SubmissionJob.updated_at < cutoff).delete()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"WARNING: could not save status of job {job.id}: {e}")
+
+    def _next_job(self):
+        # Round-robin: take the first user's oldest job, then move them to the back
+        user_key, user_jobs = self.user_queues.popitem(last=False)
+        job = user_jobs.popleft()
+        if user_jobs:
+            self.user_queues[user_key] = user_jobs
+        self.pending -= 1
+        return job
+
+    def _purge_finished(self):
+        cutoff = time.time() - JOB_RETENTION_SEC
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.user_queues:
+                    self.cond.wait()
+                job = self._next_job()
+                job.state = 'running'
+
+            try:
+                with self.app.app_context():
+                    job.result, job.http_status = job.func(*job.args)
+                # An error answer (invalid question, too many submissions, ...) is a failed job, not a verdict
+                job.state = 'failed' if job.http_status >= 400 else 'done'
+            except Exception as e:
+                print(f"🛑 SUBMISSION FAILURE: {e}")
+                job.result, job.http_status = {"error": str(e)}, 500
+                job.state = 'failed'
+
+            with self.cond:
+                job.finished_at = time.time()
+                self.active[job.user_key] -= 1
+                if not self.active[job.user_key]:
+                    del self.active[job.user_key]
+            job.done.set()
+            self._store(job)
+
+
+submission_queue = SubmissionQueue()
+metrics.gauge("submission_queue_pending", lambda: submission_queue.pending)
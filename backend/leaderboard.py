@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from sqlalchemy import func
+from model import db, User, UserProgress
+
+# With several worker processes each one only sees its own submits, so the
+# ranking is reloaded from the DB when it's older than this (0 = never)
+LEADERBOARD_REFRESH_SEC = float(os.environ.get(
+    'LEADERBOARD_REFRESH_SEC', 2 if int(os.environ.get('WEB_WORKERS', 1)) > 1 else 0))
+
+
+def _naive(when):
+    # solved_at comes back from SQLite without a timezone; keep everything naive UTC so keys compare
+    if when is None:
+        return datetime.max
+    return when.replace(tzinfo=None)
+
+
+class Leaderboard:
+    """In-memory ranking kept in step with the DB instead of re-sorting every user.
+
+    `keys` is a sorted list of (-score, last_solved, user_id): best score first,
+    earlier last solve wins ties, same order end_event has always used.
+    Finding a user's rank is a bisect, top N is a slice. Loaded from the DB
+    with one grouped query on first use (or `rebuild()` at startup) and then
+    updated by register/submit.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.users = {}  # user_id -> [username, score, last_solved]
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = 0
+
+    def _key(self, user_id):
+        username, score, last_solved = self.users[user_id]
+        return (-score, last_solved, user_id)
+
+    def _load(self):
+        rows = (
+            db.session.query(User.id, User.username, User.total_score, func.max(UserProgress.solved_at))
+            .outerjoin(UserProgress, UserProgress.user_id == User.id)
+            .group_by(User.id)
+            .all()
+        )
+        self.users = {uid: [name, score or 0, _naive(last)] for uid, name, score, last in rows}
+        self.keys = sorted(self._key(uid) for uid in self.users)
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def _stale(self):
+        return not self.loaded or (
+            LEADERBOARD_REFRESH_SEC > 0 and time.monotonic() - self.loaded_at > LEADERBOARD_REFRESH_SEC)
+
+    def rebuild(self):
+        """Reloads everything from the DB. Call inside an app context."""
+        with self.lock:
+            self._load()
+
+    def clear(self):
+        with self.lock:
+            self.keys = []
+            self.users = {}
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+
+    def add_user(self, user_id, username):
+        with self.lock:
+            if not self.loaded:
+                self._load()  # already includes the new row
+                return
+            if user_id in self.users:
+                return
+            self.users[user_id] = [username, 0, datetime.max]
+            insort(self.keys, self._key(user_id))
+
+    def record(self, user_id, score_change, solved_at=None):
+        """Applies a committed score delta (and new solve time) for one user.
+
+        Deltas rather than absolute values, so two submits finishing in
+        either order end up in the same place.
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()  # the DB already has this change
+                return
+            entry = self.users.get(user_id)
+            if entry is None:
+                return
+            old_key = self._key(user_id)
+            entry[1] += score_change
+            if solved_at is not None:
+                solved_at = _naive(solved_at)
+                # datetime.max means "never solved", anything real replaces it
+                if entry[2] == datetime.max or solved_at > entry[2]:
+                    entry[2] = solved_at
+            new_key = self._key(user_id)
+            if new_key != old_key:
+                del self.keys[bisect_left(self.keys, old_key)]
+                insort(self.keys, new_key)
+
+    def _row(self, key, rank):
+        user_id = key[2]
+        return {"rank": rank, "id": user_id, "username": self.users[user_id][0], "total_score": -key[0]}
+
+    def top(self, limit=None):
+        """Best `limit` users (everyone if None), already in leaderboard order."""
+        with self.lock:
+            if self._stale():
+                self._load()
+            keys = self.keys if limit is None else self.keys[:limit]
+            return [self._row(key, rank) for rank, key in enumerate(keys, start=1)]
+
+    def rank(self, user_id):
+        """The user's leaderboard row (with 1-based rank), or None if unknown."""
+        with self.lock:
+            if self._stale():
+                self._load()
+            if user_id not in self.users:
+                return None
+            key = self._key(user_id)
+            return self._row(key, bisect_left(self.keys, key) + 1)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+leaderboard = Leaderboard()
@@ -1,3 +1,5 @@
+import re
+
 
 def easy1(n):
     return n * 2
@@ -98,140 +100,6 @@ def hard3(n):
 
 
 
-QUESTIONS = {
-    1: {
-        "difficulty": "Easy",
-        "base_points": 100,
-        "max_probes": 5,
-        "description": "The machine responds predictably. Discover the pattern.",
-        "func": easy1,
-        # HIDDEN TESTS: The user code must pass ALL of these to win
-        "test_cases": [10, 69, -5, 100, 79],
-        "templates": {
-            "python": "def solve(n):\n    # Write your logic here\n    return n",
-            "c": "int solve(int n) {\n    // Write your logic here\n    return n;\n}"
-        }
-    },
-    2: {
-        "difficulty": "Easy",
-        "base_points": 100,
-        "max_probes": 5,
-        "description": "The output belongs to one of two possible categories.",
-        "func": easy2,
-        "test_cases": [-5, 12, 20, 35, 101],
-        "templates": {
-            "python": "def solve(n):\n    # Write your logic here\n    return value",
-            "c": "int solve(int n) {\n    // Write your logic here\n    return value;\n}"
-        }
-    },
-    3: {
-        "difficulty": "Easy",
-        "base_points": 100,
-        "max_probes": 5,
-        "description": "The system reacts to the internal structure of the multi-digit numbers.(try number like 123)",
-        "func": easy3,
-        "test_cases": [-567, 123, 101, 69, 202],
-        "templates": {
-            "python": "def solve(n):\n    # Write your logic here\n    return value",
-            "c": "int solve(int n) {\n    // Write your logic here\n    return value;\n}"
-        }
-    },
-    4: {
-        "difficulty": "Easy",
-        "base_points": 100,
-        "max_probes": 5,
-        "description": "The system reacts to the internal structure of the multi-digit numbers.(try number like 12345)",
-        "func": easy4,
-        "test_cases": [-56789, 1009, 101, 69, 0000],
-        "templates": {
-            "python": "def solve(n):\n    # Write your logic here\n    return value",
-            "c": "int solve(int n) {\n    // Write your logic here\n    return value;\n}"
-        }
-    },
-    5: {
-        "difficulty": "Medium",
-        "base_points": 200,
-        "max_probes": 7,
-        "description": "The system reveals a growing sequence.",
-        "func": med1,
-        "test_cases": [5, 10, 15, 20, 25],
-        "templates": {
-            "python": "def solve(n):\n    # Return a list OR print the sequence\n    return []",
-            "c": "void solve(int n) {\n    // Print the sequence separated by spaces\n    // e.g. printf(\"%d \", val);\n}"
-        }
-    },
-    6: {
-        "difficulty": "Medium",
-        "base_points": 200,
-        "max_probes": 7,
-        "description": "Only certain numbers are accepted by the system.",
-        "func": med2,
-        "test_cases": [10, 20, 30, 50, 100],
-        "templates": {
-            "python": "def solve(n):\n    # Return a list OR print the sequence\n    return []",
-            "c": "void solve(int n) {\n    // Print the sequence separated by spaces\n    // e.g. printf(\"%d \", val);\n}"
-        }   
-    },
-    7: {
-        "difficulty": "Medium",
-        "base_points": 200,
-        "max_probes": 7,
-        "description": "Observe the output carefully; it keeps building up.",
-        "func": med3,
-        "test_cases": [10, 2, 6, 12, 8],
-        "templates": {
-            "python": "def solve(n):\n    # Return a list OR print the sequence\n    return []",
-            "c": "void solve(int n) {\n    // Print the sequence separated by spaces\n    // e.g. printf(\"%d \", val);\n}"
-        }   
-    },
-
-    8: {
-        "difficulty": "Hard",
-        "base_points": 300,
-        "max_probes": 10,
-        "description": "Position matters. Rules change as the sequence grows.",
-        "func": hard1,
-        "test_cases": [5, 10, 20, 25, 30],
-        "templates": {
-            "python": "def solve(n):\n    # Return a list OR print the sequence\n    return []",
-            "c": "void solve(int n) {\n    // Print the sequence separated by spaces\n    // e.g. printf(\"%d \", val);\n}"
-        }
-    },
-    9: {
-        "difficulty": "Hard",
-        "base_points": 300,
-        "max_probes": 10,
-        "description": "Past influences the future.",
-        "func": hard2,
-        "test_cases": [5, 10, 8, 3, 0],
-        "templates": {
-            "python": "def solve(n):\n    # Return a list OR print the sequence\n    return []",
-            "c": "void solve(int n) {\n    // Print the sequence separated by spaces\n    // e.g. printf(\"%d \", val);\n}"
-        }
-    },
-    10: {
-        "difficulty": "Hard",
-        "base_points": 300,
-        "max_probes": 10,
-        "description": "Certain inputs cause err in system behavior.",
-        "func": hard3,
-        "test_cases": [10, 15, 20, 55, 100],
-        "templates": {
-            "python": "def solve(n):\n    # Return a list OR print the sequence\n    return []",
-            "c": "void solve(int n) {\n    // Print the sequence separated by spaces\n    // e.g. printf(\"%d \", val);\n}"
-        }
-    }
-}
-
-def get_question_config(q_id):
-    return QUESTIONS.get(q_id)
-
-def run_host_logic(q_id, user_input):
-    config = QUESTIONS.get(q_id)
-    if not config:
-        return None
-    return config["func"](user_input)
-
 def tie_breaker_logic(n):
     # Logic: Return the sum of even digits 
     # 1234 -> (2+4) = 6
@@ -244,17 +112,61 @@ def tie_breaker_logic(n):
         n //= 10
     return total
 
-TIE_BREAKER_QUESTIONS = {
-    101: {
-        "difficulty": "Tie Breaker",
-        "base_points": 500,
-        "max_probes": 5,
-        "description": "Final Showdown: pay close attention to the input and outputs. (try numbers like 123456 or larger)",
-        "func": tie_breaker_logic,
-        "test_cases": [1234, 2468, 1357, 1020, 888],
-        "templates": {
-            "python": "def solve(n):\n    # Write your logic here\n    return 0",
-            "c": "int solve(int n) {\n    // Write your logic here\n    return 0;\n}"
-        }
-    }
-}
+
+def normalize(val):
+    """Canonical text form used to compare sandbox output with the reference answer."""
+    # Handle Booleans explicitly (Python logic returns bool, C returns 1/0)
+    if isinstance(val, bool):
+        return "1" if val else "0"
+
+    s = str(val).strip()
+    
+    # Handle stringified booleans
+    if s == "True": return "1"
+    if s == "False": return "0"
+
+    # Remove brackets if present (Python list string)
+    if s.startswith('[') and s.endswith(']'):
+        s = s[1:-1]
+    # Replace commas with spaces
+    s = s.replace(',', ' ')
+    # Collapse whitespace
+    return " ".join(s.split())
+
+
+# The tokens normalize() keeps: anything between whitespace and commas
+_TOKEN = re.compile(r'[^\s,]+')
+
+
+def matches_expected(output, expected_tokens):
+    """Same verdict as normalize(output) == " ".join(expected_tokens), for sandbox output text.
+
+    Walks the output token by token and stops at the first one that
+    differs, instead of normalising the whole (possibly huge) output first.
+    """
+    s = output.strip()
+    if s == "True": s = "1"
+    if s == "False": s = "0"
+    if s.startswith('[') and s.endswith(']'):
+        s = s[1:-1]
+
+    count = 0
+    for count, token in enumerate(_TOKEN.finditer(s), start=1):
+        if count > len(expected_tokens) or token.group() != expected_tokens[count - 1]:
+            return False
+    return count == len(expected_tokens)
+
+
+def precompute_expected(questions):
+    """Runs every hidden test once and stores the normalized answers (registry.py calls this on load).
+
+    Adds `expected` (normalized output per test case, same order as
+    `test_cases`), `expected_tokens` (the same, split for matches_expected)
+    and `c_mode` ('void' when the answers are sequences that the C solution
+    prints, 'int' otherwise) to each question config.
+    """
+    for config in questions.values():
+        raw = [config["func"](test_val) for test_val in config.get("test_cases", [])]
+        config["expected"] = [normalize(value) for value in raw]
+        config["expected_tokens"] = [expected.split() for expected in config["expected"]]
+        config["c_mode"] = 'void' if any(isinstance(value, list) for value in raw) else 'int'
@@ -0,0 +1,180 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+
+# --- METRICS SETTINGS ---
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_RESERVOIR = int(os.environ.get('METRICS_RESERVOIR', 1024))  # samples kept per series
+METRICS_WINDOW_SEC = int(os.environ.get('METRICS_WINDOW_SEC', 300))  # quantiles cover roughly the last 1-2 windows
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "blackbox_"
+
+HELP = {
+    "http_request_duration_seconds": "Time spent handling a request, by route",
+    "db_query_duration_seconds": "Time spent in one SQL statement, by statement type",
+    "sandbox_phase_duration_seconds": "Time spent in each sandbox step (acquire, upload, compile, run, ...)",
+    "probe_eval_duration_seconds": "Time spent running a question's hidden function for /probe",
+    "normalize_duration_seconds": "Time spent normalising and comparing one submission's outputs",
+    "sandbox_admission_wait_seconds": "Time a sandbox run waited for a free run slot",
+    "sandbox_runs_waiting": "Sandbox runs waiting for a run slot",
+    "sandbox_runs_running": "Sandbox runs holding a run slot",
+    "sandbox_run_slots": "Sandbox runs allowed at once in this process",
+    "sandbox_pool_idle": "Idle warm containers, by image",
+    "submission_queue_pending": "Submissions queued but not yet picked up by a worker",
+}
+
+
+class Histogram:
+    """Latency samples for one series: exact count/sum, quantiles from a reservoir.
+
+    Keeps a uniform random sample (reservoir sampling) of at most
+    METRICS_RESERVOIR values per window, so memory and observe() cost stay
+    flat no matter the traffic. The previous window is kept for scrapes
+    that come right after a rollover.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = []
+        self.previous = []
+        self.seen = 0  # observations in the current window
+        self.window_start = time.monotonic()
+
+    def observe(self, value, now):
+        self.count += 1
+        self.sum += value
+        if now - self.window_start > METRICS_WINDOW_SEC:
+            self.previous, self.samples, self.seen = self.samples, [], 0
+            self.window_start = now
+        self.seen += 1
+        if len(self.samples) < METRICS_RESERVOIR:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.seen)
+            if slot < METRICS_RESERVOIR:
+                self.samples[slot] = value
+
+    def quantiles(self):
+        values = sorted(self.samples + self.previous)
+        if not values:
+            return [(q, float('nan')) for q in QUANTILES]
+        return [(q, values[min(len(values) - 1, int(q * len(values)))]) for q in QUANTILES]
+
+
+class Metrics:
+    """In-process latency summaries and gauges, rendered in Prometheus text format by /metrics."""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.series = {}  # (name, labels tuple) -> Histogram
+        self.gauges = {}  # (name, labels tuple) -> function returning the current value
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        now = time.monotonic()
+        with self.lock:
+            histogram = self.series.get(key)
+            if histogram is None:
+                histogram = self.series[key] = Histogram()
+            histogram.observe(seconds, now)
+
+    def gauge(self, name, read, **labels):
+        """Registers `read()` as the `name` gauge; it's called on every scrape."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = read
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Times the `with` block into the `name` summary."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self.lock:
+            snapshot = [(name, labels, h.count, h.sum, h.quantiles()) for (name, labels), h in self.series.items()]
+            gauges = sorted(self.gauges.items(), key=lambda item: item[0])
+
+        lines = []
+        for name in sorted({item[0] for item in snapshot}):
+            metric = PREFIX + name
+            lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} summary")
+            for _, labels, count, total, quantiles in sorted(s for s in snapshot if s[0] == name):
+                for q, value in quantiles:
+                    lines.append(f"{metric}{_labels(labels + (('quantile', str(q)),))} {value:.6f}")
+                lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+        for name in sorted({key[0] for key, _ in gauges}):
+            metric = PREFIX + name
+            lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} gauge")
+            for (_, labels), read in (item for item in gauges if item[0][0] == name):
+                try:
+                    value = float(read())
+                except Exception:
+                    continue  # a broken gauge shouldn't take the whole scrape down
+                lines.append(f"{metric}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    # --- HOOKS ---
+    def init_app(self, app):
+        """Times every request, labelled by route pattern (not raw URL, to keep series few)."""
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def _start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            start = g.pop('metrics_start', None)
+            if start is not None:
+                route = request.url_rule.rule if request.url_rule else "unmatched"
+                self.observe("http_request_duration_seconds", time.perf_counter() - start,
+                             route=route, method=request.method, status=str(response.status_code))
+            return response
+
+    def instrument_engine(self, engine):
+        """Times every SQL statement on `engine`, labelled by its first keyword."""
+        if not self.enabled:
+            return
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context.metrics_start = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, 'metrics_start', None)
+            if start is not None:
+                kind = statement.split(None, 1)[0].upper() if statement.strip() else "?"
+                self.observe("db_query_duration_seconds", time.perf_counter() - start, statement=kind)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+metrics = Metrics()
@@ -20,6 +20,11 @@ class User(db.Model):
     
 
 class UserProgress(db.Model):
+    # One row per (user, question); every route looks progress up by this pair
+    __table_args__ = (
+        db.Index('uq_progress_user_question', 'user_id', 'question_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     question_id = db.Column(db.Integer, nullable=False)
@@ -34,9 +39,31 @@ class UserProgress(db.Model):
 
 
 class ProbeLog(db.Model):
+    # Serves /get_progress: filter by (user, question), newest first
+    __table_args__ = (
+        db.Index('ix_probe_log_user_question_time', 'user_id', 'question_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     question_id = db.Column(db.Integer, nullable=False)
     input_val = db.Column(db.String(50))
     output_val = db.Column(db.String(50))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class EventState(db.Model):
+    # Single row (id=1) shared by every worker process; `version` goes up on each change
+    id = db.Column(db.Integer, primary_key=True)
+    ended = db.Column(db.Boolean, default=False, nullable=False)
+    top5 = db.Column(db.Text, default='[]', nullable=False)  # JSON list shown in the game-over modal
+    tie_breaker = db.Column(db.Boolean, default=False, nullable=False)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+
+class SubmissionJob(db.Model):
+    # Status of queued submissions, so any worker process can answer /submit/status
+    id = db.Column(db.String(32), primary_key=True)
+    state = db.Column(db.String(10), nullable=False)
+    http_status = db.Column(db.Integer)
+    result = db.Column(db.Text)  # JSON, set once the job finished
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
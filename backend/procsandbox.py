@@ -0,0 +1,361 @@
+import ctypes
+import ctypes.util
+import errno
+import io
+import json
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from collections import deque
+
+# --- PROCESS SANDBOX SETTINGS ---
+# Same kernel as the server, so this is meant for a dedicated event box;
+# Docker stays the high-isolation backend. Before a worker reads its job it
+# is chrooted into an empty directory, drops to PROC_SANDBOX_UID (or, when
+# the server isn't root, into a user namespace with no capabilities), loses
+# its network and gets a seccomp filter. If any of that fails the worker
+# refuses the job, and the pool's self-check keeps the backend unavailable.
+PROC_POOL_SIZE = int(os.environ.get('PROC_POOL_SIZE', 4))
+PROC_MEMORY_MB = int(os.environ.get('PROC_MEMORY_MB', 256))
+PROC_CPU_SEC = int(os.environ.get('PROC_CPU_SEC', 20))  # backstop, the harness enforces the real limits
+PROC_BATCH_TIMEOUT = float(os.environ.get('PROC_BATCH_TIMEOUT', 10))
+PROC_SANDBOX_UID = int(os.environ.get('PROC_SANDBOX_UID', 65534))  # only used when the server runs as root
+PROC_SANDBOX_GID = int(os.environ.get('PROC_SANDBOX_GID', 65534))
+# Processes a worker may add on top of what its uid already runs (the kernel
+# counts RLIMIT_NPROC per uid). The harness forks one child per input, and
+# that child may not fork at all.
+PROC_NPROC = int(os.environ.get('PROC_NPROC', 16))
+
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNS = 0x00020000
+CLONE_NEWNET = 0x40000000
+
+SCMP_ACT_ALLOW = 0x7fff0000
+SCMP_ACT_ERRNO = 0x00050000  # | errno
+_LINUX_CAPABILITY_VERSION_3 = 0x20080522
+
+# Syscalls user code has no business making. Filtered with libseccomp
+# (called through ctypes, no Python bindings needed); without it workers
+# refuse to run anything.
+DENIED_SYSCALLS = [
+    "socket", "socketpair", "connect", "bind", "listen", "accept", "accept4",
+    "execve", "execveat", "fork", "vfork", "ptrace", "process_vm_readv", "process_vm_writev",
+    "kill", "tkill", "tgkill", "rt_sigqueueinfo", "rt_tgsigqueueinfo", "pidfd_open", "pidfd_send_signal",
+    "mount", "umount2", "pivot_root", "chroot", "unshare", "setns", "setsid", "setpgid",
+    "setuid", "setgid", "setreuid", "setregid", "setresuid", "setresgid", "setgroups", "capset",
+    "open_by_handle_at", "name_to_handle_at",
+]
+
+# The chroot is empty, so everything the harness and typical solutions import
+# has to be loaded before it. Anything else fails with ModuleNotFoundError.
+PRELOAD_MODULES = [
+    "bisect", "collections", "decimal", "fractions", "functools", "heapq", "itertools", "math",
+    "operator", "random", "re", "select", "signal", "statistics", "string", "time",
+]
+
+
+class SandboxUnavailable(Exception):
+    pass
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def _check(ok, what):
+    if not ok:
+        err = ctypes.get_errno()
+        raise OSError(err, f"{what}: {os.strerror(err)}")
+
+
+def _unshare(libc, flags):
+    if hasattr(os, 'unshare'):
+        os.unshare(flags)
+    else:
+        _check(libc.unshare(flags) == 0, "unshare")
+
+
+def _seccomp_filter():
+    """Builds the filter (not loaded yet): libseccomp has to be opened before the chroot."""
+    path = ctypes.util.find_library('seccomp') or 'libseccomp.so.2'
+    lib = ctypes.CDLL(path, use_errno=True)  # OSError if libseccomp isn't installed
+    lib.seccomp_init.restype = ctypes.c_void_p
+    lib.seccomp_init.argtypes = [ctypes.c_uint32]
+    lib.seccomp_syscall_resolve_name.argtypes = [ctypes.c_char_p]
+    lib.seccomp_rule_add.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_int, ctypes.c_uint]
+    lib.seccomp_load.argtypes = [ctypes.c_void_p]
+    lib.seccomp_release.argtypes = [ctypes.c_void_p]
+
+    ctx = lib.seccomp_init(SCMP_ACT_ALLOW)
+    if not ctx:
+        raise OSError("seccomp_init failed")
+    for name in DENIED_SYSCALLS:
+        number = lib.seccomp_syscall_resolve_name(name.encode())
+        if number < 0:
+            continue  # syscall doesn't exist on this architecture
+        rc = lib.seccomp_rule_add(ctx, SCMP_ACT_ERRNO | errno.EPERM, number, 0)
+        if rc < 0:
+            raise OSError(-rc, f"seccomp rule for {name} failed")
+    return lib, ctx
+
+
+def _load_seccomp(lib, ctx):
+    rc = lib.seccomp_load(ctx)  # also sets no_new_privs
+    lib.seccomp_release(ctx)
+    if rc < 0:
+        raise OSError(-rc, "seccomp_load failed")
+
+
+def _drop_capabilities(libc):
+    header = _CapHeader(_LINUX_CAPABILITY_VERSION_3, 0)
+    data = (_CapData * 2)()
+    _check(libc.capset(ctypes.byref(header), data) == 0, "capset")
+
+
+def _uid_tasks(uid):
+    """Processes and threads `uid` runs right now, what RLIMIT_NPROC is checked against."""
+    count = 0
+    for pid in os.listdir('/proc'):
+        if pid.isdigit():
+            try:
+                if os.stat(f'/proc/{pid}').st_uid == uid:
+                    count += len(os.listdir(f'/proc/{pid}/task'))
+            except OSError:
+                pass  # exited meanwhile
+    return count
+
+
+def _restrict():
+    """Locks the worker down before it ever sees user code. Raises if any step fails."""
+    limit_bytes = PROC_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+    resource.setrlimit(resource.RLIMIT_CPU, (PROC_CPU_SEC, PROC_CPU_SEC))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    for name in PRELOAD_MODULES:
+        __import__(name)
+    libc = ctypes.CDLL(None, use_errno=True)
+    seccomp_lib, seccomp_ctx = _seccomp_filter()
+
+    nproc = _uid_tasks(PROC_SANDBOX_UID if os.geteuid() == 0 else os.getuid()) + PROC_NPROC
+
+    # The cwd is the worker's own empty directory: make it the whole filesystem
+    if os.geteuid() == 0:
+        _unshare(libc, CLONE_NEWNET)
+        os.chroot('.')
+        os.chdir('/')
+        os.setgroups([])
+        os.setgid(PROC_SANDBOX_GID)
+        os.setuid(PROC_SANDBOX_UID)
+    else:
+        # Unprivileged: a user namespace gives us the right to chroot, then every capability goes
+        _unshare(libc, CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWNET)
+        os.chroot('.')
+        os.chdir('/')
+    _drop_capabilities(libc)
+    resource.setrlimit(resource.RLIMIT_NPROC, (nproc, nproc))  # no fork bombs (root would ignore it)
+    _load_seccomp(seccomp_lib, seccomp_ctx)
+
+
+class CappedText(io.StringIO):
+    """StringIO that silently drops everything past `limit` characters (and sets `truncated`)."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.truncated = False
+
+    def write(self, s):
+        room = self.limit - self.tell()
+        if room > 0:
+            super().write(s[:room])
+        if len(s) > room:
+            self.truncated = True
+        return len(s)
+
+
+def _worker_main():
+    try:
+        _restrict()
+    except Exception as e:
+        # Fail closed: never run user code in a half locked-down worker
+        sys.stdout.write(json.dumps({"error": f"sandbox lockdown failed: {e}"}))
+        sys.stdout.flush()
+        return
+
+    # The parent writes one job and closes the pipe; empty means "shut down"
+    raw = sys.stdin.buffer.read()
+    if not raw:
+        return
+    job = json.loads(raw)
+    result_out = sys.stdout
+
+    # Run exactly what the Docker sandbox runs: user code + harness, with the
+    # inputs on stdin. The parent parses the JSON lines the same way.
+    sys.stdin = io.StringIO(job["input"])
+    sys.argv = ["script.py", str(job["time_limit_ms"]), str(job["output_limit"])]
+    # The harness caps each test's output; these cap anything written around it
+    out, err = CappedText(job["read_limit"]), CappedText(job["output_limit"])
+    sys.stdout, sys.stderr = out, err
+    try:
+        exec(compile(job["code"], "script.py", "exec"), {"__name__": "__main__"})
+    except BaseException as e:
+        # Only the error itself, the worker's own frames are none of the user's business
+        err.write("".join(traceback.format_exception_only(type(e), e)))
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+
+    result_out.write(json.dumps({"stdout": out.getvalue(), "stderr": err.getvalue(), "overflowed": out.truncated}))
+    result_out.flush()
+
+
+class ProcessPool:
+    """Pre-started, single-use worker processes for running Python submissions.
+
+    Workers are fresh interpreters started ahead of time (and locked down
+    right away), so a job only pays for a pipe round trip. Every worker runs
+    exactly one job and is then thrown away, so nothing a submission does can
+    leak into the next. `check()` must pass before any job is run.
+    """
+
+    def __init__(self, size=PROC_POOL_SIZE):
+        self.size = size
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.error = "not checked yet"
+
+    def check(self):
+        """Runs a probe job that tries to break out; raises SandboxUnavailable if anything gets through."""
+        try:
+            stdout, stderr, _ = self._run(SELF_CHECK, [], 1000, 1024, 1024, PROC_BATCH_TIMEOUT)
+        except Exception as e:
+            error = str(e)
+        else:
+            error = None if stdout.strip() == "ok" else \
+                f"isolation check failed: {(stdout.strip() or stderr.strip())[:200]}"
+        self.error = error
+        if error:
+            raise SandboxUnavailable(error)
+
+    def _spawn(self):
+        # Empty, private working directory that we delete with the worker.
+        # -I: isolated mode, no user site-packages or PYTHON* env vars
+        workdir = tempfile.mkdtemp(prefix="procbox-")
+        # Own session, so _discard can kill whatever the worker forked as well
+        worker = subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=workdir, close_fds=True, start_new_session=True
+        )
+        worker.workdir = workdir
+        return worker
+
+    def _discard(self, worker):
+        try:
+            os.killpg(worker.pid, signal.SIGKILL)
+        except OSError:
+            pass  # already gone
+        worker.wait()
+        shutil.rmtree(worker.workdir, ignore_errors=True)
+
+    def fill(self):
+        while True:
+            with self.lock:
+                if len(self.idle) >= self.size:
+                    return
+            worker = self._spawn()
+            with self.lock:
+                self.idle.append(worker)
+
+    def _acquire(self):
+        with self.lock:
+            while self.idle:
+                worker = self.idle.popleft()
+                if worker.poll() is None:
+                    return worker
+                self._discard(worker)
+        return self._spawn()
+
+    def run(self, full_code, inputs, time_limit_ms, output_limit, read_limit, timeout=PROC_BATCH_TIMEOUT):
+        """Returns (stdout, stderr, overflowed) of the harness, like a capped Docker exec would.
+
+        `output_limit` is the harness' per-input cap, `read_limit` caps the
+        whole stdout (stderr gets output_limit); `overflowed` says stdout was
+        cut off there.
+
+        Raises TimeoutError (after killing the worker) if the whole batch runs
+        longer than `timeout` seconds, and SandboxUnavailable if the workers
+        can't be locked down.
+        """
+        if self.error:
+            raise SandboxUnavailable(self.error)
+        return self._run(full_code, inputs, time_limit_ms, output_limit, read_limit, timeout)
+
+    def _run(self, full_code, inputs, time_limit_ms, output_limit, read_limit, timeout):
+        worker = self._acquire()
+        job = json.dumps({
+            "code": full_code,
+            "input": "".join(f"{val}\n" for val in inputs),
+            "time_limit_ms": time_limit_ms,
+            "output_limit": output_limit,
+            "read_limit": read_limit
+        })
+        try:
+            raw, _ = worker.communicate(job.encode('utf-8'), timeout=timeout)
+            result = json.loads(raw)
+            if "error" in result:
+                raise SandboxUnavailable(result["error"])
+            return result["stdout"], result["stderr"], result.get("overflowed", False)
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f"sandbox run exceeded {timeout}s")
+        except (ValueError, KeyError, OSError):
+            # Worker died: out of memory, CPU limit, os._exit, ...
+            return "", "Error: Sandbox process crashed", False
+        finally:
+            self._discard(worker)
+            # Replace the used worker off the request path
+            threading.Thread(target=self.fill, daemon=True).start()
+
+    def shutdown(self):
+        with self.lock:
+            workers = list(self.idle)
+            self.idle.clear()
+        for worker in workers:
+            self._discard(worker)
+
+
+# What check() runs in a worker: every way out it tries must be closed
+SELF_CHECK = """
+import os
+leaks = []
+try:
+    os.listdir('/proc')
+    leaks.append('filesystem')
+except OSError:
+    pass
+try:
+    os.kill(os.getppid(), 0)
+    leaks.append('signals')
+except OSError:
+    pass
+if os.getuid() == 0:
+    leaks.append('root')
+print(' '.join(leaks) or 'ok')
+"""
+
+process_pool = ProcessPool()
+
+
+if __name__ == "__main__":
+    _worker_main()
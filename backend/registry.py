@@ -0,0 +1,209 @@
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+
+from logic import precompute_expected
+
+# --- QUESTION PACKS ---
+# Every *.json file in QUESTIONS_DIR is a pack: {"round": "main" | "tie_breaker",
+# "questions": [...]}. A question names its reference function as
+# "module:function" ("logic:easy1") and may name a faster drop-in for probes
+# the same way under "fast". Packs can ship their own .py modules next to
+# the JSON; the directory is on the import path.
+QUESTIONS_DIR = os.environ.get('QUESTIONS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions'))
+QUESTIONS_RELOAD_SEC = float(os.environ.get('QUESTIONS_RELOAD_SEC', 2))  # 0 = only load at startup
+
+ROUNDS = ("main", "tie_breaker")
+REQUIRED_KEYS = ("id", "difficulty", "base_points", "max_probes", "func", "test_cases")
+PUBLIC_KEYS = ("id", "difficulty", "base_points", "max_probes", "description", "templates")
+
+
+class PackError(Exception):
+    pass
+
+
+def resolve(spec):
+    """'module:function' -> the function (imports the module if needed)."""
+    module_name, _, func_name = spec.partition(':')
+    func = getattr(importlib.import_module(module_name), func_name, None)
+    if not callable(func):
+        raise PackError(f"{spec}: no such function")
+    return func
+
+
+class LazyFunction:
+    """A 'module:function' that is only imported on its first call.
+
+    Used for the fast probe versions, so their module (and numpy) isn't
+    loaded by processes that never get a probe for that question.
+    """
+
+    def __init__(self, spec):
+        module_name, _, func_name = spec.partition(':')
+        if not func_name or importlib.util.find_spec(module_name) is None:
+            raise PackError(f"{spec}: no such module")
+        self.spec = spec
+        self.__name__ = func_name
+        self.func = None
+
+    def __call__(self, n):
+        func = self.func
+        if func is None:
+            func = self.func = resolve(self.spec)
+        return func(n)
+
+
+class QuestionRegistry:
+    """All questions, loaded from the packs in QUESTIONS_DIR.
+
+    Loading validates every pack, imports the reference functions and runs
+    the hidden tests once (`precompute_expected`), so requests only do
+    lookups. The public list for /questions is built at load time as well.
+    A background thread checks the packs (and the pack modules) every
+    QUESTIONS_RELOAD_SEC and reloads when one changed; the new set is swapped
+    in whole, and a broken edit keeps the old set and logs a warning. Each
+    worker process watches on its own, so no restart is needed. Functions
+    registered with `on_change` run after every reload.
+    """
+
+    def __init__(self, path=QUESTIONS_DIR):
+        self.path = path
+        self.by_id = {}
+        self.rounds = {name: [] for name in ROUNDS}
+        self.views = {name: [] for name in ROUNDS}
+        self.signature = None
+        self.version = 0
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def init_app(self, app):
+        self.reload(raise_errors=True)  # refuse to start with broken packs
+        if QUESTIONS_RELOAD_SEC > 0:
+            threading.Thread(target=self._watch, name="question-reload", daemon=True).start()
+
+    def on_change(self, func):
+        self.listeners.append(func)
+        return func
+
+    def get(self, question_id):
+        return self.by_id.get(question_id)
+
+    def round(self, name):
+        """Question configs of one round, by id."""
+        return self.rounds[name]
+
+    def public(self, name):
+        """What /questions shows for a round (no functions or test cases)."""
+        return self.views[name]
+
+    # --- LOADING ---
+    def _pack_files(self):
+        return sorted(os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.json'))
+
+    def _module_files(self):
+        return sorted(os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.py'))
+
+    def _signature(self):
+        stats = []
+        for file in self._pack_files() + self._module_files():
+            st = os.stat(file)
+            stats.append((file, st.st_mtime_ns, st.st_size))
+        return tuple(stats)
+
+    def _reload_pack_modules(self):
+        # Only modules shipped with the packs; backend modules need a restart like any code change
+        for module in list(sys.modules.values()):
+            file = getattr(module, '__file__', None)
+            if file and os.path.dirname(os.path.abspath(file)) == os.path.abspath(self.path):
+                importlib.reload(module)
+
+    def _load_question(self, pack, raw):
+        missing = [key for key in REQUIRED_KEYS if key not in raw]
+        if missing:
+            raise PackError(f"{pack}: question {raw.get('id', '?')} is missing {', '.join(missing)}")
+        if not isinstance(raw["test_cases"], list) or not all(isinstance(v, int) for v in raw["test_cases"]):
+            raise PackError(f"{pack}: question {raw['id']} test_cases must be a list of integers")
+
+        config = {key: value for key, value in raw.items() if key not in ("func", "fast")}
+        config["reference"] = config["func"] = resolve(raw["func"])
+        config["fast"] = LazyFunction(raw["fast"]) if "fast" in raw else None
+        return config
+
+    def _load(self):
+        rounds = {name: [] for name in ROUNDS}
+        by_id = {}
+        if self.path not in sys.path:
+            sys.path.append(self.path)
+
+        for file in self._pack_files():
+            pack = os.path.basename(file)
+            try:
+                with open(file) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                raise PackError(f"{pack}: {e}")
+            name = data.get("round", "main")
+            if name not in rounds:
+                raise PackError(f"{pack}: unknown round {name!r}")
+
+            for raw in data.get("questions", []):
+                config = self._load_question(pack, raw)
+                if config["id"] in by_id:
+                    raise PackError(f"{pack}: duplicate question id {config['id']}")
+                by_id[config["id"]] = config
+                rounds[name].append(config)
+
+        for configs in rounds.values():
+            configs.sort(key=lambda config: config["id"])
+
+        # Hidden answers come from the reference functions, probes use the fast ones
+        precompute_expected(by_id)
+        for config in by_id.values():
+            if config["fast"] is not None:
+                config["func"] = config["fast"]
+
+        views = {name: [{"description": "", "templates": {},
+                         **{key: config[key] for key in PUBLIC_KEYS if key in config}}
+                        for config in configs]
+                 for name, configs in rounds.items()}
+        return by_id, rounds, views
+
+    def reload(self, raise_errors=False):
+        """Loads the packs again if any file changed. Returns True when the questions were replaced."""
+        with self.lock:
+            signature = None
+            try:
+                signature = self._signature()
+                if signature == self.signature:
+                    return False
+                if self.signature is not None:
+                    self._reload_pack_modules()
+                by_id, rounds, views = self._load()
+            except Exception as e:
+                if raise_errors:
+                    raise
+                print(f"WARNING: question packs not reloaded, keeping the current ones: {e}")
+                self.signature = signature  # don't retry the same broken files every tick
+                return False
+
+            self.by_id, self.rounds, self.views = by_id, rounds, views
+            self.signature = signature
+            self.version += 1
+            if self.version > 1:
+                print(f"Reloaded {len(by_id)} questions from {self.path}")
+
+        for listener in self.listeners:
+            listener()
+        return True
+
+    def _watch(self):
+        while True:
+            time.sleep(QUESTIONS_RELOAD_SEC)
+            self.reload()
+
+
+registry = QuestionRegistry()
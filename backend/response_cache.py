@@ -0,0 +1,51 @@
+import hashlib
+import threading
+
+from flask import Response, current_app, request
+
+
+class ResponseCache:
+    """Prebuilt JSON bodies (with ETags) for responses that only change with global state.
+
+    Each body is serialised once per state version and then served as bytes.
+    Clients that send back the ETag in If-None-Match get an empty 304.
+    Anything that changes the event state must call `bump()` so the next
+    request rebuilds (routes.state_changed does).
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.bodies = {}  # key -> (body bytes, etag)
+        self.lock = threading.Lock()
+
+    def bump(self):
+        with self.lock:
+            self.version += 1
+            self.bodies.clear()
+
+    def _get(self, key, build):
+        with self.lock:
+            version = self.version
+            cached = self.bodies.get(key)
+        if cached is not None:
+            return cached
+
+        body = current_app.json.dumps(build()).encode('utf-8')
+        cached = (body, hashlib.sha1(body).hexdigest()[:20])
+        with self.lock:
+            # Don't store a body built from state that changed while we were building it
+            if version == self.version:
+                self.bodies[key] = cached
+        return cached
+
+    def respond(self, key, build):
+        """Returns the cached response for `key`, building it with `build()` if needed."""
+        body, etag = self._get(key, build)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Browsers may keep it, but have to revalidate every time (cheap with the ETag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+
+response_cache = ResponseCache()
@@ -1,13 +1,25 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from model import db, User, UserProgress, ProbeLog
-from logic import QUESTIONS, TIE_BREAKER_QUESTIONS
+from logic import matches_expected
+from registry import registry
 from datetime import datetime, timezone
-from sandbox import run_docker
+from sandbox import run_batch, readiness
+from jobs import submission_queue, QueueFull
+from database import probe_log_buffer, ensure_progress, reserve_probe, refund_probe, archive_database
+from sqlalchemy import select, tuple_, update
+from cache import TTLCache
+from leaderboard import leaderboard
+from response_cache import response_cache
+from events import event_stream
+from event_state import event_state
+from metrics import metrics
+import hashlib
+import os
+import threading
+import time
 
 bp = Blueprint('main', __name__)
 
-TIE_BREAKER_MODE = False
-
 
 @bp.route('/register', methods=['POST'])
 def register():
@@ -30,6 +42,8 @@ def register():
     new_user = User(username=username)
     db.session.add(new_user)
     db.session.commit()
+    leaderboard.add_user(new_user.id, new_user.username)
+    known_users.set(str(new_user.id), True)
 
     return jsonify({
         "message": f"Welcome, {username}!", 
@@ -47,23 +61,25 @@ def get_users():
     return jsonify(result)
 
 
+def build_questions():
+    # Prebuilt by the registry when the packs load, see registry.py
+    return registry.public("tie_breaker" if event_state.tie_breaker else "main")
+
+
 @bp.route('/questions', methods=['GET'])
 def get_questions():
-    global TIE_BREAKER_MODE
-    target_questions = TIE_BREAKER_QUESTIONS if TIE_BREAKER_MODE else QUESTIONS
-
-    questions = []
-    for q_id, config in target_questions.items():
-        questions.append({
-            "id": q_id,
-            "difficulty": config["difficulty"],
-            "base_points": config["base_points"],
-            "max_probes": config["max_probes"],
-            "description": config.get("description", ""),
-            "templates": config.get("templates", {})
-        })
-    return jsonify(questions)
+    # Only changes when the tie breaker starts/ends or the packs reload, so it's served prebuilt (see response_cache.py)
+    return response_cache.respond('questions', build_questions)
+
 
+# Probe answers only depend on (question, input), so popular inputs are remembered.
+# Sequence answers can be MAX_PROBE_INPUT long, so the cache is also bounded
+# by the total number of list items it holds (about 8 bytes each)
+MAX_PROBE_INPUT = int(os.environ.get('MAX_PROBE_INPUT', 100000))
+probe_cache = TTLCache(maxsize=int(os.environ.get('PROBE_CACHE_SIZE', 4096)),
+                       max_weight=int(os.environ.get('PROBE_CACHE_MAX_ITEMS', 1000000)),
+                       weigh=lambda answer: len(answer) if isinstance(answer, list) else 1)
+MISSING = object()
 
 # Probe Route: User tests inputs against logic
 @bp.route('/probe', methods=['POST'])
@@ -79,57 +95,61 @@ def probe():
     except (ValueError, TypeError):
         return jsonify({"error": "Input must be a valid integer"}), 400
 
-    config = QUESTIONS.get(question_id) or TIE_BREAKER_QUESTIONS.get(question_id)
+    config = registry.get(question_id)
     if not config:
         return jsonify({"error": "Invalid Question ID"}), 404
 
-    # 2. Track Usage in DB
-    progress = UserProgress.query.filter_by(
-        user_id=user_id, question_id=question_id).first()
-
-    # Create progress entry if it's their first time
-    if not progress:
-        # Explicitly set probes_used=0 so Python knows it's an integer immediately
-        progress = UserProgress(
-            user_id=user_id,
-            question_id=question_id,
-            probes_used=0
-        )
-        db.session.add(progress)
-        # We don't commit yet because we might update it below
-
-    # Check if they have probes left
-    if progress.probes_used >= config['max_probes']:
-        return jsonify({"error": "No probes left! Try submitting code."}), 403
-
-    # 3. Run YOUR Hidden Logic
+    # Some reference functions are superlinear, don't let one probe pin a thread
+    max_input = config.get('max_input', MAX_PROBE_INPUT)
+    if abs(val) > max_input:
+        return jsonify({"error": f"Input too large! Keep it between -{max_input} and {max_input}."}), 400
+
+    if not is_known_user(str(user_id)):
+        return jsonify({"error": "Unknown user"}), 404
+
+    # 2. Use up a probe first (one atomic statement, only if one is left) and
+    # commit it, so nobody gets the hidden function evaluated past their quota
+    # and no write lock is held while it runs
     try:
-        expected_output = config['func'](val)
-        
-        # Update counts
-        progress.probes_used += 1
-        
-        # Save to History Log
-        new_log = ProbeLog(
-            user_id=user_id,
-            question_id=question_id,
-            input_val=str(val),
-            output_val=str(expected_output)
-        )
-        db.session.add(new_log)
+        probes_used = reserve_probe(user_id, question_id, config['max_probes'])
+        if probes_used is None:
+            db.session.rollback()
+            return jsonify({"error": "No probes left! Try submitting code."}), 403
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    try:
+        # 3. Run YOUR Hidden Logic
+        expected_output = probe_cache.get((question_id, val), MISSING)
+        if expected_output is MISSING:
+            with metrics.span("probe_eval_duration_seconds", question=question_id):
+                expected_output = config['func'](val)
+            probe_cache.set((question_id, val), expected_output)
+
+        # Save to History Log (may be group-committed later, see database.py)
+        probe_log_buffer.add(user_id, question_id, str(val), str(expected_output))
 
         db.session.commit()
 
         return jsonify({
             "input": val,
             "output": expected_output,
-            "probes_left": config['max_probes'] - progress.probes_used
+            "probes_left": config['max_probes'] - probes_used
         })
     except Exception as e:
+        db.session.rollback()
+        # Didn't get an answer, so it doesn't count
+        try:
+            refund_probe(user_id, question_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
-# Submit Route: Runs User Code in Docker
+# Submit Route: Queues User Code for the Docker workers
 @bp.route('/submit', methods=['POST'])
 def submit():
     data = request.json
@@ -141,243 +161,382 @@ def submit():
     if not user_code:
         return jsonify({"error": "No code provided"}), 400
 
-    # 1. Get Config
-    config = QUESTIONS.get(question_id) or TIE_BREAKER_QUESTIONS.get(question_id)
+    config = registry.get(question_id)
     if not config:
         return jsonify({"error": "Invalid Question"}), 404
 
+    # The sandbox run happens on a submission worker, never on a request thread
+    try:
+        job = submission_queue.submit(user_id, run_submission, user_id, question_id, user_code, language)
+    except QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '2'
+        return response, 429
+
+    return jsonify(job.to_dict()), 202
+
+
+# Only a few request threads may sit in a long-poll at once
+LONG_POLL_MAX_WAIT = 15
+long_poll_slots = threading.BoundedSemaphore(4)
+REMOTE_POLL_INTERVAL = 0.25  # DB check interval while long-polling another process' job
+
+@bp.route('/submit/status/<job_id>', methods=['GET'])
+def submit_status(job_id):
+    # Optional long-poll: ?wait=<seconds> blocks until the job finishes
+    try:
+        wait = min(float(request.args.get('wait', 0)), LONG_POLL_MAX_WAIT)
+    except ValueError:
+        wait = 0
+
+    job = submission_queue.get(job_id)
+    if not job:
+        # Submitted through another worker process? Its status is in the DB
+        return remote_submit_status(job_id, wait)
+
+    if wait > 0 and not job.done.is_set() and long_poll_slots.acquire(blocking=False):
+        try:
+            job.done.wait(wait)
+        finally:
+            long_poll_slots.release()
+
+    return jsonify(job.to_dict())
+
+
+def remote_submit_status(job_id, wait):
+    status = submission_queue.lookup(job_id)
+    if not status:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    if wait > 0 and "result" not in status and long_poll_slots.acquire(blocking=False):
+        try:
+            deadline = time.monotonic() + wait
+            while "result" not in status and time.monotonic() < deadline:
+                time.sleep(REMOTE_POLL_INTERVAL)
+                status = submission_queue.lookup(job_id) or status
+        finally:
+            long_poll_slots.release()
+
+    return jsonify(status)
+
+
+# Sandbox results of recent submissions, keyed by submission_key()
+verdict_cache = TTLCache(
+    maxsize=int(os.environ.get('VERDICT_CACHE_SIZE', 2048)),
+    ttl=float(os.environ.get('VERDICT_CACHE_TTL', 600))
+)
+
+def submission_key(question_id, language, user_code, test_cases):
+    # Trailing whitespace and line endings don't change what the code does
+    lines = user_code.replace('\r\n', '\n').strip('\n').split('\n')
+    normalized = "\n".join(line.rstrip() for line in lines)
+    code_hash = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    # Editing a question's test cases changes the key, so stale verdicts are never served
+    tests_hash = hashlib.sha256(repr(test_cases).encode('utf-8')).hexdigest()
+    return (question_id, language, code_hash, tests_hash)
+
+
+SCORE_UPDATE_ATTEMPTS = 5
+
+def run_submission(user_id, question_id, user_code, language):
+    """Grades one submission. Runs on a submission worker inside an app context."""
+    # 1. Get Config
+    config = registry.get(question_id)
+    if not config:
+        return {"error": "Invalid Question"}, 404
+
     # 2. Run Hidden Test Cases
     test_cases = config.get('test_cases', [])
     passed_count = 0
     logs = []
 
-    for test_val in test_cases:
-        expected = config['func'](test_val)
-        
-        # Determine C Mode based on expected output type
-        c_mode = 'int'
-        if isinstance(expected, list):
-            c_mode = 'void'
-            
-        actual = run_docker(user_code, test_val, language, c_mode=c_mode)
+    # Expected outputs are precomputed (and normalized) when the question packs load
+    expected_outputs = config['expected_tokens']
+    c_mode = config['c_mode']
+
+    # Identical resubmissions reuse the earlier sandbox results
+    verdict_key = submission_key(question_id, language, user_code, test_cases)
+    results = verdict_cache.get(verdict_key)
+    if results is None:
+        # One sandbox execution (and one compile for C) for all hidden tests
+        results = run_batch(user_code, test_cases, language, c_mode=c_mode)
+        # Don't remember infrastructure failures or timeouts: time limits are wall-clock,
+        # so a TLE can just mean the host was busy. Only load-independent verdicts
+        if not any(r['status'] in ('error', 'timeout') for r in results):
+            verdict_cache.set(verdict_key, results)
+
+    with metrics.span("normalize_duration_seconds"):
+        for test_val, expected, result in zip(test_cases, expected_outputs, results):
+            actual = result['output']
+            usage = {"time_ms": result.get('time_ms'), "memory_kb": result.get('memory_kb')}
+
+            if result['status'] == 'timeout':
+                logs.append({"input": test_val, "status": "TLE", **usage})
+            elif result['status'] == 'output_limit':
+                logs.append({"input": test_val, "status": "OLE", **usage})
+            elif matches_expected(actual, expected):
+                passed_count += 1
+                logs.append({"input": test_val, "status": "Pass", **usage})
+            else:
+                logs.append({"input": test_val, "status": "Fail", "got": actual, "expected": "Hidden", **usage})
 
-        # Normalize for comparison
-        def normalize(val):
-            # Handle Booleans explicitly (Python logic returns bool, C returns 1/0)
-            if isinstance(val, bool):
-                return "1" if val else "0"
+    # 3. Database & Scoring Logic
+    # Progress is written with a compare-and-set against the values we scored
+    # from, and total_score with an in-place increment, so two submits racing
+    # on the same question can't double count or lose points.
+    for attempt in range(SCORE_UPDATE_ATTEMPTS):
+        progress = ensure_progress(user_id, question_id)
 
-            s = str(val).strip()
-            
-            # Handle stringified booleans
-            if s == "True": return "1"
-            if s == "False": return "0"
-
-            # Remove brackets if present (Python list string)
-            if s.startswith('[') and s.endswith(']'):
-                s = s[1:-1]
-            # Replace commas with spaces
-            s = s.replace(',', ' ')
-            # Collapse whitespace
-            return " ".join(s.split())
-
-        if normalize(actual) == normalize(expected):
-            passed_count += 1
-            logs.append({"input": test_val, "status": "Pass"})
-        else:
-            logs.append({"input": test_val, "status": "Fail", "got": actual, "expected": "Hidden"})
+        # Scoring Formula: (10 * tests_passed) + (probes_left * 0.5 * base_points)
 
-    # 3. Database & Scoring Logic
-    user = User.query.get(user_id)
-    progress = UserProgress.query.filter_by(user_id=user_id, question_id=question_id).first()
-
-    if not progress:
-        progress = UserProgress(
-            user_id=user_id, 
-            question_id=question_id, 
-            probes_used=0, 
-            tests_passed=0,
-            is_solved=False,
-            score_earned=0
-        )
-        db.session.add(progress)
-
-    # Scoring Formula: (10 * tests_passed) + (probes_left * 0.5 * base_points)
-
-    # 1. Calculate Probes Left
-    probes_left = max(0, config['max_probes'] - progress.probes_used)
-    
-    # 2. Calculate Multiplier
-    # Logic: Allow full points if 1 probe is used (probes_left = max - 1)
-    question = progress.question_id
-    probe_multiplier = 0.0
-    
-    if question in [1, 2, 101]:
-        probe_multiplier = probes_left * 0.25
-    elif question in [3, 4]:
-        probe_multiplier = probes_left * 0.167
-    elif question == 5:
-        probe_multiplier = probes_left * 0.12
+        # 1. Calculate Probes Left
+        probes_left = max(0, config['max_probes'] - progress.probes_used)
         
-    # Ensure it doesn't exceed 1.0 (base points)
-    probe_multiplier = min(1.0, probe_multiplier)
+        # 2. Calculate Multiplier
+        # Each unused probe is worth probe_weight (set per question in its pack)
+        probe_multiplier = probes_left * config.get('probe_weight', 0.0)
 
-    
-    # 3. Calculate New Total Score for this Question
-    # We use the BEST passed_count achieved so far (or current if better)
-    best_passed = max(progress.tests_passed, passed_count)
-    
-    new_question_score = (10 * best_passed) + (probe_multiplier * config['base_points'])
-    new_question_score = int(new_question_score) # Ensure integer
-    
-    # 4. Calculate Delta (Change in score)
-    score_change = new_question_score - progress.score_earned
-    
-    # 5. Update Progress
-    if passed_count > progress.tests_passed:
-        progress.tests_passed = passed_count
-        progress.solved_at = datetime.now(timezone.utc)
+        # Ensure it doesn't exceed 1.0 (base points)
+        probe_multiplier = min(1.0, probe_multiplier)
+
+        
+        # 3. Calculate New Total Score for this Question
+        # We use the BEST passed_count achieved so far (or current if better)
+        best_passed = max(progress.tests_passed, passed_count)
+        
+        new_question_score = (10 * best_passed) + (probe_multiplier * config['base_points'])
+        new_question_score = int(new_question_score) # Ensure integer
         
-    is_complete = (passed_count == len(test_cases))
-    if is_complete:
-        progress.is_solved = True
-
-    if progress.tests_passed > 0:
-        # 6. Update User Total Score
-        if score_change != 0:
-            user.total_score += score_change
-            progress.score_earned = new_question_score
+        # 4. Calculate Delta (Change in score)
+        score_change = new_question_score - progress.score_earned
+        
+        # 5. Update Progress
+        changes = {}
+        if passed_count > progress.tests_passed:
+            changes['tests_passed'] = passed_count
+            changes['solved_at'] = datetime.now(timezone.utc)
             
+        is_complete = (passed_count == len(test_cases))
+        if is_complete:
+            changes['is_solved'] = True
+
+        score_applied = best_passed > 0 and score_change != 0
+        if score_applied:
+            changes['score_earned'] = new_question_score
+
+        if changes:
+            result = db.session.execute(
+                update(UserProgress)
+                .where(UserProgress.id == progress.id,
+                       UserProgress.tests_passed == progress.tests_passed,
+                       UserProgress.score_earned == progress.score_earned)
+                .values(**changes)
+            )
+            if result.rowcount == 0:
+                # Another submit for this question got there first, score again on fresh values
+                db.session.rollback()
+                continue
+
+        if score_applied:
+            # 6. Update User Total Score
+            db.session.execute(
+                update(User).where(User.id == user_id).values(total_score=User.total_score + score_change)
+            )
             logs.append({
                 "status": "Bonus", 
                 "msg": f"Score Update: {score_change:+d} pts (Total for Q: {new_question_score})"
             })
-    db.session.commit()
+        db.session.commit()
+        if score_applied or 'solved_at' in changes:
+            leaderboard.record(user_id, score_change if score_applied else 0, changes.get('solved_at'))
+        break
+    else:
+        return {"error": "Too many simultaneous submissions, please submit again."}, 409
 
-    return jsonify({
+    return {
         "solved": is_complete,
         "score_added": score_change,
         "tests_passed": passed_count,
         "total_tests": len(test_cases),
         "details": logs
-    })
+    }, 200
+
+# Probe history comes in pages, newest first
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 50))
+HISTORY_MAX_PAGE_SIZE = 200
 
 @bp.route('/get_progress', methods=['POST'])
 def get_progress():
     data = request.json
     user_id = data.get('user_id')
     question_id = data.get('question_id')
+    try:
+        limit = min(max(int(data.get('limit') or HISTORY_PAGE_SIZE), 1), HISTORY_MAX_PAGE_SIZE)
+    except (ValueError, TypeError):
+        return jsonify({"error": "limit must be an integer"}), 400
     
-    # 1. Get attempts count
-    progress = UserProgress.query.filter_by(user_id=user_id, question_id=question_id).first()
-    probes_used = progress.probes_used if progress else 0
-    
-    # 2. Get Probe History (Newest first)
-    logs = ProbeLog.query.filter_by(user_id=user_id, question_id=question_id).order_by(ProbeLog.timestamp.desc()).all()
+    # 1. Get attempts count (just the counter column, no log rows needed)
+    probes_used = db.session.execute(
+        select(UserProgress.probes_used)
+        .where(UserProgress.user_id == user_id, UserProgress.question_id == question_id)
+    ).scalar() or 0
     
-    history = [{"in": log.input_val, "out": log.output_val} for log in logs]
+    # 2. Get Probe History (Newest first), including rows still in the write-behind buffer
+    probe_log_buffer.flush()
+    query = (
+        select(ProbeLog.id, ProbeLog.timestamp, ProbeLog.input_val, ProbeLog.output_val)
+        .where(ProbeLog.user_id == user_id, ProbeLog.question_id == question_id)
+        .order_by(ProbeLog.timestamp.desc(), ProbeLog.id.desc())
+        .limit(limit + 1)  # one extra row tells us if there's another page
+    )
+
+    # 3. Keyset pagination: the cursor is "<timestamp>|<id>" of the last row of the previous page
+    cursor = data.get('cursor')
+    if cursor:
+        if not isinstance(cursor, str):
+            return jsonify({"error": "Invalid cursor"}), 400
+        try:
+            cursor_time, cursor_id = cursor.rsplit('|', 1)
+            cursor_key = (datetime.fromisoformat(cursor_time), int(cursor_id))
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        query = query.where(tuple_(ProbeLog.timestamp, ProbeLog.id) < cursor_key)
+
+    rows = db.session.execute(query).all()
+    page = rows[:limit]
+    history = [{"in": row.input_val, "out": row.output_val} for row in page]
+    next_cursor = f"{page[-1].timestamp.isoformat()}|{page[-1].id}" if len(rows) > limit else None
     
     return jsonify({
         "probes_used": probes_used,
-        "history": history
+        "history": history,
+        "next_cursor": next_cursor
     })
 
 
-# Global State for Event Status
-EVENT_ENDED = False
-TOP_5_WINNERS = []
-
-@bp.route('/admin/end_event', methods=['POST'])
-def end_event():
-    global EVENT_ENDED, TOP_5_WINNERS
-    
-    # 1. Get all users
-    users = User.query.all()
+LEADERBOARD_MAX_LIMIT = int(os.environ.get('LEADERBOARD_MAX_LIMIT', 100))
 
-    # 2. Calculate Last Solved Time for Tie-Breaking
-    user_stats = []
-    for u in users:
-        # Find the latest 'solved_at' time from all their progress
-        # If they have no progress or no solved_at, use a default old time (or max time if we want them last)
-        # Actually, for tie-breaking, "lesser time" (earlier) is better.
-        # If they haven't solved anything, their score is 0, so they are at the bottom anyway.
-        
-        valid_times = [p.solved_at for p in u.progress if p.solved_at]
-        last_solved = max(valid_times) if valid_times else datetime.max
+# Event Status (ended / top 5 / tie breaker) lives in the DB so every worker
+# process sees the same thing; see event_state.py
+@event_state.on_change
+def state_changed():
+    """Runs after any status change, made here or by another process."""
+    response_cache.bump()
+    known_users.clear()  # a reset deletes users
+    leaderboard.rebuild()
+    event_stream.publish(event_state.snapshot())
 
-        user_stats.append({
-            "user": u,
-            "score": u.total_score,
-            "last_solved": last_solved
-        })
+@registry.on_change
+def questions_changed():
+    """Runs after the question packs were reloaded (see registry.py)."""
+    response_cache.bump()
+    probe_cache.clear()  # answers may have changed with the functions
 
-    # 3. Sort: Primary = Score (Desc), Secondary = Time (Asc)
-    # We use a tuple for sorting. Python sorts tuples element by element.
-    # We want Score DESC, so we use -score.
-    # We want Time ASC, so we use time directly.
-    user_stats.sort(key=lambda x: (-x["score"], x["last_solved"]))
-    
-    # 4. Prepare Leaderboard Data
-    leaderboard = []
-    for stat in user_stats:
-        u = stat["user"]
-        leaderboard.append({
-            "id": u.id,
-            "username": u.username,
-            "total_score": u.total_score
-        })
+@bp.route('/admin/end_event', methods=['POST'])
+def end_event():
+    # 1. Ranked list from the leaderboard, reloaded from the DB first: the
+    # in-memory copy can miss the last seconds of submits scored by other
+    # worker processes, and these are the final standings
+    # (Score desc, then earliest last solve - see leaderboard.py)
+    leaderboard.rebuild()
+    leaderboard_rows = [
+        {"id": row["id"], "username": row["username"], "total_score": row["total_score"]}
+        for row in leaderboard.top()
+    ]
     
-    # 5. Get Top 3
-    top3 = leaderboard[:3]
+    # 2. Get Top 3
+    top3 = leaderboard_rows[:3]
     
-    # 6. Set Global State
-    EVENT_ENDED = True
-    TOP_5_WINNERS = leaderboard[:5] # Store Top 5 for the modal
+    # 3. Set Event State (Top 5 for the modal)
+    event_state.set(ended=True, top5=leaderboard_rows[:5])
     
     return jsonify({
-        "leaderboard": leaderboard,
+        "leaderboard": leaderboard_rows,
         "top3": top3
     })
 
+def clear_event_data():
+    """Empties users, progress and probe logs. Returns where the old DB file was archived, if it was."""
+    probe_log_buffer.discard()
+    db.session.close()  # hand our connection back, the file swap waits for all of them
+
+    # Fast path: swap in an empty DB file and keep the old one (see database.py)
+    archived = archive_database()
+    if archived:
+        return os.path.basename(archived)
+
+    db.session.query(ProbeLog).delete()
+    db.session.query(UserProgress).delete()
+    db.session.query(User).delete()
+    db.session.commit()
+    return None
+
 @bp.route('/admin/reset_event', methods=['POST'])
 def reset_event():
-    global EVENT_ENDED, TOP_5_WINNERS, TIE_BREAKER_MODE
-    
-    # 1. Reset Global State
-    EVENT_ENDED = False
-    TOP_5_WINNERS = []
-    TIE_BREAKER_MODE = False
-    
-    # 2. Clear Database
+    # 1. Clear Database
     try:
-        db.session.query(ProbeLog).delete()
-        db.session.query(UserProgress).delete()
-        db.session.query(User).delete()
-        db.session.commit()
-        return jsonify({"message": "Event reset and database cleared successfully."})
+        archived = clear_event_data()
+        return jsonify({"message": "Event reset and database cleared successfully.", "archive": archived})
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
+    finally:
+        # 2. Reset Event State (even if clearing failed), after the DB work so
+        # clients told about it already see their user gone
+        event_state.set(ended=False, top5=[], tie_breaker=False)
 
 @bp.route('/admin/start_tiebreaker', methods=['POST'])
 def start_tiebreaker():
-    global EVENT_ENDED, TOP_5_WINNERS, TIE_BREAKER_MODE
-    
-    # 1. Reset Global State
-    EVENT_ENDED = False
-    TOP_5_WINNERS = []
-    TIE_BREAKER_MODE = True
-    
-    # 2. Clear Database
+    # 1. Clear Database
     try:
-        db.session.query(ProbeLog).delete()
-        db.session.query(UserProgress).delete()
-        db.session.query(User).delete()
-        db.session.commit()
-        return jsonify({"message": "Tie breaker started and database cleared successfully."})
+        archived = clear_event_data()
+        return jsonify({"message": "Tie breaker started and database cleared successfully.", "archive": archived})
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
+    finally:
+        # 2. Switch to Tie Breaker Mode
+        event_state.set(ended=False, top5=[], tie_breaker=True)
+
+@bp.route('/ready', methods=['GET'])
+def ready():
+    # Readiness probe: 503 until every sandbox image is pinned/built and its pool is warm
+    status = readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus scrape target; local only, it shows internals
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({"error": "Forbidden"}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/leaderboard', methods=['GET'])
+def live_leaderboard():
+    # Live standings: top N plus (optionally) where the asking user stands
+    limit = min(max(request.args.get('limit', 10, type=int), 1), LEADERBOARD_MAX_LIMIT)
+    user_id = request.args.get('user_id', type=int)
+
+    return jsonify({
+        "leaderboard": leaderboard.top(limit),
+        "total_users": len(leaderboard),
+        "you": leaderboard.rank(user_id) if user_id else None
+    })
+
+# Every client polls /event/status, so "this user exists" is remembered for a bit.
+# Only hits are cached: after a reset ids are handed out again from 1, and a
+# user registering through another process must be known here right away.
+# A reset clears the cache in every process (state_changed).
+known_users = TTLCache(maxsize=int(os.environ.get('KNOWN_USERS_CACHE_SIZE', 4096)),
+                       ttl=int(os.environ.get('KNOWN_USERS_CACHE_TTL', 60)))
+
+def is_known_user(user_id):
+    if known_users.get(user_id):
+        return True
+    valid = db.session.get(User, user_id) is not None
+    if valid:
+        known_users.set(user_id, True)
+    return valid
 
 @bp.route('/event/status', methods=['GET'])
 def event_status():
@@ -386,13 +545,10 @@ def event_status():
     
     if user_id and user_id != 'admin':
         # Check if user exists in DB
-        user = User.query.get(user_id)
-        if not user:
-            is_valid_user = False
+        is_valid_user = is_known_user(user_id)
 
-    return jsonify({
-        "ended": EVENT_ENDED,
-        "top5": TOP_5_WINNERS,
-        "valid_user": is_valid_user,
-        "tie_breaker": TIE_BREAKER_MODE
+    # Same two bodies for everyone until the event state changes
+    return response_cache.respond(('status', is_valid_user), lambda: {
+        **event_state.snapshot(),
+        "valid_user": is_valid_user
     })
@@ -1,130 +1,1013 @@
 
 import docker
+import json
 import os
-import tempfile
+import io
+import tarfile
+import threading
+import time
+import atexit
+from collections import deque
+from contextlib import contextmanager
+from compile_cache import compile_cache, cache_key
+from procsandbox import SandboxUnavailable, process_pool
+from metrics import metrics
+from docker.types import Mount
+from images import HARNESS_DIR, IMAGE_PULL, ImageResolver, ImageSpec
 
-try:
-    client = docker.from_env()
-except Exception as e:
-    print(f"WARNING: Docker not found! {e}")
-    client = None
+# --- POOL SETTINGS ---
+# Long-lived sandbox containers are kept warm per image so a submit only pays
+# for running the user code, not for booting a container.
+POOL_MIN_SIZE = int(os.environ.get('SANDBOX_POOL_MIN', 2))
+POOL_MAX_SIZE = int(os.environ.get('SANDBOX_POOL_MAX', 8))
+POOL_MAX_USES = int(os.environ.get('SANDBOX_POOL_MAX_USES', 50))  # recycle after this many runs
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('SANDBOX_POOL_ACQUIRE_TIMEOUT', 30))
+POOL_HEALTH_INTERVAL = float(os.environ.get('SANDBOX_POOL_HEALTH_INTERVAL', 30))
+
+POOL_LABEL = "blackbox.sandbox"
+SANDBOX_MEMORY_MB = int(os.environ.get('SANDBOX_MEMORY_MB', 128))  # mem_limit of every sandbox container
+
+# Containers are shared by many submissions, so user code runs as nobody on a
+# read-only root filesystem: the only writable places are /app (a per-container
+# volume) and the tmpfs mounts, and those are wiped after every run.
+SANDBOX_USER = os.environ.get('SANDBOX_USER', '65534:65534')
+SANDBOX_PIDS_LIMIT = int(os.environ.get('SANDBOX_PIDS_LIMIT', 64))
+SANDBOX_TMPFS_MB = int(os.environ.get('SANDBOX_TMPFS_MB', 64))
+
+# Base images per language. The images actually run are built from these at
+# startup with the harness baked in (see prepare_sandbox_images / images.py).
+PYTHON_BASE_IMAGE = os.environ.get('SANDBOX_PYTHON_IMAGE', "python:3.9-slim")
+C_BASE_IMAGE = os.environ.get('SANDBOX_C_IMAGE', "gcc:latest")
+
+# 'docker' runs everything in containers. 'process' runs Python submissions in
+# pre-forked, rlimited worker processes (see procsandbox.py); C still uses Docker.
+# 'stub' runs nothing and answers every input with "0" after SANDBOX_STUB_MS -
+# only for benchmarking the backend without Docker (machinetest.py --stub).
+SANDBOX_BACKEND = os.environ.get('SANDBOX_BACKEND', 'docker')
+SANDBOX_STUB_MS = float(os.environ.get('SANDBOX_STUB_MS', 0))
+
+# --- DOCKER CONNECTION & ADMISSION ---
+def _host_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _host_memory_mb():
+    # MemAvailable counts reclaimable cache too, unlike the free pages sysconf reports
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _default_max_running():
+    # One run per CPU, but never more containers at full memory than fit in RAM;
+    # split between server processes, each has its own limiter
+    capacity = _host_cpus()
+    memory_mb = _host_memory_mb()
+    if memory_mb:
+        capacity = min(capacity, memory_mb // SANDBOX_MEMORY_MB)
+    return max(1, capacity // max(int(os.environ.get('WEB_WORKERS', 1)), 1))
+
+
+SANDBOX_MAX_RUNNING = int(os.environ.get('SANDBOX_MAX_RUNNING', 0)) or _default_max_running()
+SANDBOX_MAX_STARTS = int(os.environ.get('SANDBOX_MAX_STARTS', 2))  # container creates/removes at once
+SANDBOX_ADMIT_TIMEOUT = float(os.environ.get('SANDBOX_ADMIT_TIMEOUT', 60))
+# Runs, their exec threads, container starts and health checks can all hold a connection at once
+DOCKER_POOL_SIZE = int(os.environ.get('DOCKER_POOL_SIZE', 0)) or 2 * SANDBOX_MAX_RUNNING + SANDBOX_MAX_STARTS + 2
+DOCKER_TIMEOUT = int(os.environ.get('DOCKER_TIMEOUT', 60))
+
+
+class SandboxManager:
+    """The Docker client every thread shares, and how much sandbox work may run at once.
+
+    The client's HTTP connection pool is sized for everything that can talk
+    to dockerd concurrently. `admit()`/`leave()` bracket a sandbox run:
+    at most max_running go at once and the rest wait (up to a timeout)
+    instead of all piling onto dockerd and the host's memory. Container
+    creates and removes go through `starting()`, a smaller limit, so pool
+    refills after a burst don't stampede the daemon either.
+    """
+
+    def __init__(self, max_running=SANDBOX_MAX_RUNNING, max_starts=SANDBOX_MAX_STARTS,
+                 pool_size=DOCKER_POOL_SIZE, timeout=DOCKER_TIMEOUT):
+        try:
+            self.client = docker.from_env(max_pool_size=pool_size, timeout=timeout)
+        except Exception as e:
+            print(f"WARNING: Docker not found! {e}")
+            self.client = None
+        self.max_running = max_running
+        self.run_slots = threading.BoundedSemaphore(max_running)
+        self.start_slots = threading.BoundedSemaphore(max_starts)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+
+    def admit(self, timeout=SANDBOX_ADMIT_TIMEOUT):
+        """Waits for a run slot. Raises TimeoutError; on success the caller must `leave()`."""
+        start = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+        admitted = self.run_slots.acquire(timeout=timeout)
+        with self.lock:
+            self.waiting -= 1
+            if admitted:
+                self.running += 1
+        metrics.observe("sandbox_admission_wait_seconds", time.perf_counter() - start,
+                        admitted="yes" if admitted else "no")
+        if not admitted:
+            raise TimeoutError("Sandbox is overloaded, try again shortly")
+
+    def leave(self):
+        with self.lock:
+            self.running -= 1
+        self.run_slots.release()
+
+    @contextmanager
+    def starting(self):
+        with self.start_slots:
+            yield
+
+
+manager = SandboxManager()
+client = manager.client  # shared by everything below
+
+metrics.gauge("sandbox_runs_waiting", lambda: manager.waiting)
+metrics.gauge("sandbox_runs_running", lambda: manager.running)
+metrics.gauge("sandbox_run_slots", lambda: manager.max_running)
+
+# --- TIME LIMITS ---
+TEST_TIME_LIMIT_MS = int(os.environ.get('SANDBOX_TEST_TIME_LIMIT_MS', 2000))            # per input
+SUBMISSION_TIME_LIMIT = float(os.environ.get('SANDBOX_SUBMISSION_TIME_LIMIT', 15))      # whole batch, seconds
+COMPILE_TIME_LIMIT = float(os.environ.get('SANDBOX_COMPILE_TIME_LIMIT', 30))
+
+# --- OUTPUT LIMITS ---
+# The harness stops a test once it has printed this many bytes (argv[2]).
+# Everything read back from the container is capped as well, in case user
+# code writes past the harness (os.write on fd 1, C write(2), stderr floods).
+OUTPUT_LIMIT_BYTES = int(os.environ.get('SANDBOX_OUTPUT_LIMIT_BYTES', 64 * 1024))
+
+PHASE_METRIC = "sandbox_phase_duration_seconds"
 
 # --- HARNESSES ---
+# All inputs of a submission are run in one go. The input file holds one value
+# per line, the per-input time limit in ms is argv[1], the per-input output
+# limit in bytes argv[2], and the harness writes one JSON line per input to stdout:
+#   {"output": "...", "exit_code": 0, "timed_out": false, "output_limit": false,
+#    "time_ms": 0.1, "cpu_ms": 0.1, "memory_kb": 9000}
+# Like the C harness, every input runs in a forked child, and only the child
+# ever runs user code: it executes the module and calls solve() itself, so
+# globals changed on one input don't leak into the next, wait4 gives that
+# input's own CPU time and peak memory, and nothing the submission does can
+# write result lines. The child captures solve()'s output (capped at argv[2]
+# characters), sends one JSON object back through a pipe and exits; its fd 1
+# is a pipe the parent drains and throws away, and it may not fork
+# (RLIMIT_NPROC 0). The parent kills it past the limit plus a grace second
+# and counts any input that ran past the limit as timed out. The submission
+# comes in as _script (file name) and _source (its text).
 PYTHON_HARNESS = """
-import sys
-if __name__ == "__main__":
+import sys as _sys, io as _io, os as _os, json as _json, time as _time, signal as _signal, resource as _resource, select as _select
+class _TimeLimit(BaseException): pass
+class _OutputLimit(BaseException): pass
+class _CappedOutput(_io.StringIO):
+    # Keeps the first _max_output characters, then stops the test
+    def write(self, _s):
+        _room = _max_output - self.tell()
+        if len(_s) > _room:
+            _io.StringIO.write(self, _s[:max(_room, 0)])
+            raise _OutputLimit()
+        return _io.StringIO.write(self, _s)
+class _Discard(_io.TextIOBase):
+    # Where module-level prints go: they aren't part of any answer
+    def write(self, _s):
+        return len(_s)
+_armed = [False]
+def _on_alarm(signum, frame):
+    if _armed[0]: raise _TimeLimit()
+def _run_child(_line, _w):
+    _buf = _CappedOutput()
+    _code = 0
+    _timed_out = False
+    _output_limit = False
     try:
-        # Just read from standard in (which we will pipe from a file)
-        input_str = sys.stdin.read().strip()
-        if not input_str: exit()
-        n = int(input_str)
-        if 'solve' in globals(): 
-            ret = solve(n)
-            if ret is not None: print(ret)
-        elif 'solution' in globals(): 
-            ret = solution(n)
-            if ret is not None: print(ret)
-    except Exception as e: print(f"Runtime Error: {e}")
+        _resource.setrlimit(_resource.RLIMIT_NPROC, (0, 0))
+        _cpu = int(_limit) + 1
+        _resource.setrlimit(_resource.RLIMIT_CPU, (_cpu, _cpu + 1))
+        _armed[0] = True
+        # Keeps re-firing in case the user code swallows the first one
+        _signal.setitimer(_signal.ITIMER_REAL, _limit, 0.05)
+        _n = int(_line)
+        _sys.stdout = _Discard()
+        _globals = {"__name__": "__main__", "__builtins__": __builtins__}
+        exec(_compiled, _globals)
+        _sys.stdout = _buf
+        if 'solve' in _globals:
+            _ret = _globals['solve'](_n)
+            if _ret is not None: print(_ret)
+        elif 'solution' in _globals:
+            _ret = _globals['solution'](_n)
+            if _ret is not None: print(_ret)
+    except _TimeLimit:
+        _code = 1
+        _timed_out = True
+    except _OutputLimit:
+        _code = 1
+        _output_limit = True
+    except BaseException as _e:
+        _sys.stdout = _buf
+        try:
+            print(f"Runtime Error: {_e}")
+        except _OutputLimit:
+            pass
+        _code = 1
+    finally:
+        _armed[0] = False
+        _signal.setitimer(_signal.ITIMER_REAL, 0)
+    _data = _json.dumps({"output": _buf.getvalue(), "exit_code": _code,
+                         "timed_out": _timed_out, "output_limit": _output_limit}).encode()
+    while _data:
+        _data = _data[_os.write(_w, _data):]
+if __name__ == "__main__":
+    _limit = int(_sys.argv[1]) / 1000 if len(_sys.argv) > 1 else 2.0
+    _max_output = int(_sys.argv[2]) if len(_sys.argv) > 2 else 65536
+    _max_reply = 6 * _max_output + 256  # the child's JSON, at worst every character escaped
+    _compiled = compile(_source, _script, "exec")  # a syntax error ends the run, like running the file would
+    _signal.signal(_signal.SIGALRM, _on_alarm)
+    _stdout = _sys.stdout
+    for _line in _sys.stdin.read().split():
+        _stdout.flush()
+        _r, _w = _os.pipe()
+        _drain_r, _drain_w = _os.pipe()
+        _start = _time.perf_counter()
+        _pid = _os.fork()
+        if _pid == 0:
+            try:
+                _os.close(_r)
+                _os.close(_drain_r)
+                # Whatever goes around sys.stdout (os.write(1), sys.__stdout__) ends up in the drain
+                _os.dup2(_drain_w, 1)
+                _os.close(_drain_w)
+                _run_child(_line, _w)
+            finally:
+                _os._exit(0)
+        _os.close(_w)
+        _os.close(_drain_w)
+        _reply = b""
+        _overflow = False
+        _killed = False
+        _deadline = _start + _limit + 1
+        _open = [_r, _drain_r]
+        while _r in _open:
+            _wait = None if _killed else max(_deadline - _time.perf_counter(), 0)
+            _ready = _select.select(_open, [], [], _wait)[0]
+            if not _ready:
+                try:
+                    _os.kill(_pid, _signal.SIGKILL)
+                except OSError:
+                    pass  # not allowed here (process backend): the batch timeout is the backstop
+                _killed = True
+                continue
+            if _drain_r in _ready and not _os.read(_drain_r, 65536):
+                _open.remove(_drain_r)
+            if _r in _ready:
+                _chunk = _os.read(_r, 65536)
+                if not _chunk:
+                    break
+                _reply += _chunk
+                if len(_reply) > _max_reply:
+                    _overflow = True  # wrote around the capture: closing the pipe ends it (EPIPE)
+                    break
+        _os.close(_r)
+        _os.close(_drain_r)
+        _, _status, _usage = _os.wait4(_pid, 0)
+        _elapsed = (_time.perf_counter() - _start) * 1000
+        try:
+            _row = _json.loads(_reply)
+            # Only the fields we know, and the output cap holds even if the child wrote its own reply
+            _row = {"output": str(_row.get("output", ""))[:_max_output], "exit_code": _row["exit_code"],
+                    "timed_out": _row.get("timed_out") is True,
+                    "output_limit": _row.get("output_limit") is True or len(str(_row.get("output", ""))) > _max_output}
+        except (ValueError, TypeError, AttributeError, KeyError):
+            # No report: killed, crashed, os._exit, ...
+            _signaled = _os.WIFSIGNALED(_status)
+            _sig = _os.WTERMSIG(_status) if _signaled else 0
+            _row = {"output": "", "exit_code": 128 + _sig if _signaled else (_os.WEXITSTATUS(_status) or 1),
+                    "timed_out": not _overflow and (_killed or _sig in (_signal.SIGXCPU, _signal.SIGALRM)),
+                    "output_limit": _overflow}
+        if _elapsed > _limit * 1000 and not _row.get("output_limit"):
+            _row["timed_out"] = True
+        _row["time_ms"] = round(_elapsed, 3)
+        _row["cpu_ms"] = round((_usage.ru_utime + _usage.ru_stime) * 1000, 3)
+        _row["memory_kb"] = _usage.ru_maxrss
+        _stdout.write(_json.dumps(_row) + "\\n")
+        _stdout.flush()
 """
 
-C_HARNESS_INT = """
+# Each input runs in a forked child so a crash on one value doesn't take the
+# rest of the batch down. The child's stdout is collected through a pipe, it
+# is killed by SIGALRM/SIGXCPU when it runs past the limit (and SIGKILLed
+# once it has printed more than argv[2] bytes), and wait4 gives us its CPU
+# time and peak memory. The child can ignore SIGALRM, so the parent also
+# polls the pipe against a wall-clock deadline (limit + 1s), SIGKILLs the
+# child when it passes, and counts any test that ran past the limit as
+# timed out.
+C_HARNESS = """
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#include <signal.h>
+#include <poll.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+
+static void harness_json_str(const char *s, size_t len) {
+    putchar('"');
+    for (size_t i = 0; i < len; i++) {
+        unsigned char c = s[i];
+        if (c == '"' || c == '\\\\') { putchar('\\\\'); putchar(c); }
+        else if (c < 0x20) printf("\\\\u%04x", c);
+        else putchar(c);
+    }
+    putchar('"');
+}
 
-int main() {
+int main(int argc, char **argv) {
+    long limit_ms = argc > 1 ? atol(argv[1]) : 2000;
+    size_t max_output = argc > 2 ? (size_t) atol(argv[2]) : 65536;
     int n;
-    if (scanf("%d", &n) != 1) return 0;
-    printf("%d", solve(n));
+    while (scanf("%d", &n) == 1) {
+        int fds[2];
+        char chunk[4096];
+        char *buf = NULL;
+        size_t len = 0, cap = 0;
+        ssize_t got;
+        int status = 0, code, timed_out, output_limit = 0, killed = 0;
+        double elapsed_ms;
+        struct timespec t0, t1;
+        struct rusage usage;
+
+        fflush(stdout);
+        if (pipe(fds) != 0) return 1;
+        clock_gettime(CLOCK_MONOTONIC, &t0);
+        pid_t pid = fork();
+        if (pid == 0) {
+            struct itimerval timer = {{0, 0}, {limit_ms / 1000, (limit_ms % 1000) * 1000}};
+            struct rlimit cpu = {limit_ms / 1000 + 1, limit_ms / 1000 + 2};
+            setrlimit(RLIMIT_CPU, &cpu);
+            setitimer(ITIMER_REAL, &timer, NULL);
+            close(fds[0]);
+            dup2(fds[1], 1);
+            HARNESS_CALL
+            fflush(stdout);
+            _exit(0);
+        }
+        close(fds[1]);
+        while (1) {
+            if (!killed) {
+                struct pollfd pfd = {fds[0], POLLIN, 0};
+                clock_gettime(CLOCK_MONOTONIC, &t1);
+                long left = limit_ms + 1000 - (long) ((t1.tv_sec - t0.tv_sec) * 1000 + (t1.tv_nsec - t0.tv_nsec) / 1000000);
+                if (poll(&pfd, 1, left > 0 ? (int) left : 0) == 0) {
+                    kill(pid, SIGKILL);
+                    killed = 1;
+                    continue;
+                }
+            }
+            got = read(fds[0], chunk, sizeof chunk);
+            if (got <= 0) break;
+            if (len + got > max_output) {
+                got = max_output - len;
+                output_limit = 1;
+            }
+            if (got > 0) {
+                if (len + got > cap) { cap = (len + got) * 2; buf = realloc(buf, cap); }
+                memcpy(buf + len, chunk, got);
+                len += got;
+            }
+            if (output_limit) {
+                kill(pid, SIGKILL);
+                break;
+            }
+        }
+        close(fds[0]);
+        wait4(pid, &status, 0, &usage);
+        clock_gettime(CLOCK_MONOTONIC, &t1);
+
+        code = WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status);
+        elapsed_ms = (t1.tv_sec - t0.tv_sec) * 1000.0 + (t1.tv_nsec - t0.tv_nsec) / 1e6;
+        timed_out = !output_limit && (killed || elapsed_ms > limit_ms ||
+                    (WIFSIGNALED(status) && (WTERMSIG(status) == SIGALRM || WTERMSIG(status) == SIGXCPU)));
+        printf("{\\"output\\": ");
+        harness_json_str(buf ? buf : "", len);
+        printf(", \\"exit_code\\": %d, \\"timed_out\\": %s, \\"output_limit\\": %s, \\"time_ms\\": %.3f, \\"cpu_ms\\": %.3f, \\"memory_kb\\": %ld}\\n",
+               code, timed_out ? "true" : "false", output_limit ? "true" : "false",
+               elapsed_ms,
+               (usage.ru_utime.tv_sec + usage.ru_stime.tv_sec) * 1000.0
+                   + (usage.ru_utime.tv_usec + usage.ru_stime.tv_usec) / 1000.0,
+               usage.ru_maxrss);
+        free(buf);
+    }
     return 0;
 }
 """
 
-C_HARNESS_VOID = """
-#include <stdio.h>
-#include <stdlib.h>
+C_HARNESS_INT = C_HARNESS.replace("HARNESS_CALL", 'printf("%d", solve(n));')
+C_HARNESS_VOID = C_HARNESS.replace("HARNESS_CALL", "solve(n);")
 
-int main() {
-    int n;
-    if (scanf("%d", &n) != 1) return 0;
-    solve(n);
-    return 0;
+# In the sandbox images the harness is already on disk: the Python one reads the
+# uploaded script (last argument), the C ones are #included after the user code.
+PYTHON_RUNNER = (
+    "import sys as _sys\n"
+    "_script = _sys.argv.pop()\n"
+    "_source = open(_script).read()\n"
+) + PYTHON_HARNESS
+
+IMAGE_SPECS = {
+    'python': ImageSpec(PYTHON_BASE_IMAGE, {"run.py": PYTHON_RUNNER}),
+    'c': ImageSpec(C_BASE_IMAGE, {"harness_int.h": C_HARNESS_INT, "harness_void.h": C_HARNESS_VOID}),
 }
-"""
 
-def run_docker(user_code, input_val, language='python', c_mode='int'):
-    if not client: return "Error: Docker client not initialized"
+# --- READINESS ---
+SANDBOX_IMAGES = {}  # language -> prepared image tag, filled once by prepare_sandbox_images()
+sandbox_ready = threading.Event()  # set when images are in place and the pools are warm
+
+# --- WARM CONTAINER POOL ---
+class PoolMember:
+    """One long-lived sandbox container and how many runs it has served."""
+
+    def __init__(self, container):
+        self.container = container
+        self.uses = 0
+
+
+class ContainerPool:
+    """Keeps between min_size and max_size idle-able containers for one image.
+
+    Containers run `sleep infinity` with networking disabled, a memory and
+    pids cap, a read-only root filesystem and as SANDBOX_USER, and user code
+    is executed inside them with exec. After every run the member is reset
+    (all processes killed, /app, /tmp and /dev/shm wiped) and handed back,
+    or destroyed (and replaced, in the background) if it misbehaved or has
+    been used max_uses times.
+    """
+
+    def __init__(self, image, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, max_uses=POOL_MAX_USES):
+        self.image = image
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_uses = max_uses
+        self.idle = deque()
+        self.total = 0  # idle + checked out + being created
+        self.warming = 0  # being created by fill(), about to be idle
+        self.cond = threading.Condition()
+
+    def _create(self):
+        # No host mounts: files go in and out through in-memory tar archives.
+        # /app is an anonymous volume rather than a tmpfs because put_archive
+        # can't write into tmpfs mounts (nor into a read-only root filesystem).
+        # create + start rather than run: run would pull a missing image inline.
+        with manager.starting(), metrics.span(PHASE_METRIC, phase="create", image=self.image):
+            container = client.containers.create(
+                image=self.image,
+                command="sleep infinity",
+                working_dir="/app",
+                user=SANDBOX_USER,
+                read_only=True,
+                mounts=[Mount(target="/app", source=None, type="volume")],
+                tmpfs={"/tmp": f"rw,nosuid,nodev,size={SANDBOX_TMPFS_MB}m"},
+                mem_limit=f"{SANDBOX_MEMORY_MB}m",
+                pids_limit=SANDBOX_PIDS_LIMIT,
+                network_disabled=True,
+                labels={POOL_LABEL: self.image}
+            )
+            try:
+                container.start()
+                # The fresh volume belongs to root; the compiler has to write /app/run
+                result = container.exec_run(f"chown {SANDBOX_USER} /app", user="root")
+                if result.exit_code != 0:
+                    raise RuntimeError(f"could not prepare /app: {_decode(result.output).strip()}")
+            except Exception:
+                container.remove(force=True, v=True)
+                raise
+        return PoolMember(container)
+
+    def _destroy(self, member):
+        try:
+            with manager.starting(), metrics.span(PHASE_METRIC, phase="remove", image=self.image):
+                member.container.remove(force=True, v=True)  # v: its /app volume too
+        except Exception as e:
+            print(f"WARNING: could not remove sandbox container: {e}")
+
+    def _reset(self, member):
+        # Kill anything the user code left behind (PID 1 survives) and wipe everything it could write to
+        with metrics.span(PHASE_METRIC, phase="reset", image=self.image):
+            result = member.container.exec_run(
+                "sh -c 'kill -9 -1; rm -rf /app/* /app/.[!.]* /tmp/* /tmp/.[!.]* /dev/shm/* /dev/shm/.[!.]*'",
+                user="root")
+        return result.exit_code == 0
+
+    def _is_healthy(self, member):
+        try:
+            member.container.reload()
+            return member.container.status == 'running'
+        except Exception:
+            return False
+
+    def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.total < self.max_size:
+                    self.total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No idle sandbox for {self.image}")
+                self.cond.wait(remaining)
+
+        # Creating a container is slow, so do it outside the lock
+        try:
+            return self._create()
+        except Exception:
+            with self.cond:
+                self.total -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, member, broken=False):
+        member.uses += 1
+        keep = not broken and member.uses < self.max_uses
+        if keep:
+            try:
+                keep = self._reset(member)
+            except Exception:
+                keep = False
+
+        if keep:
+            with self.cond:
+                self.idle.append(member)
+                self.cond.notify()
+            return
+
+        # Removing and replacing a container is slow: do it off the request path
+        with self.cond:
+            self.total -= 1
+            self.cond.notify()
+        threading.Thread(target=self._replace, args=(member,), daemon=True).start()
+
+    def _replace(self, member):
+        self._destroy(member)
+        self.fill()
+
+    def fill(self):
+        """Top the pool back up to min_size idle containers (checked-out ones don't count), within max_size."""
+        while True:
+            with self.cond:
+                if len(self.idle) + self.warming >= self.min_size or self.total >= self.max_size:
+                    return
+                self.total += 1
+                self.warming += 1
+            try:
+                member = self._create()
+            except Exception as e:
+                print(f"WARNING: could not warm {self.image} sandbox: {e}")
+                with self.cond:
+                    self.total -= 1
+                    self.warming -= 1
+                return
+            with self.cond:
+                self.warming -= 1
+                self.idle.append(member)
+                self.cond.notify()
+
+    def health_check(self):
+        # Only idle members are checked; busy ones are checked by their run
+        with self.cond:
+            members = list(self.idle)
+            self.idle.clear()
+
+        healthy = []
+        for member in members:
+            if self._is_healthy(member):
+                healthy.append(member)
+            else:
+                print(f"WARNING: replacing unhealthy {self.image} sandbox")
+                self._destroy(member)
+                with self.cond:
+                    self.total -= 1
+
+        with self.cond:
+            self.idle.extend(healthy)
+            self.cond.notify_all()
+        self.fill()
+
+    def shutdown(self):
+        with self.cond:
+            members = list(self.idle)
+            self.idle.clear()
+            self.total -= len(members)
+        for member in members:
+            self._destroy(member)
+
+
+POOLS = {}
+_pools_lock = threading.Lock()
 
-    # 1. SETUP COMMANDS & CODE
+
+def get_pool(image):
+    with _pools_lock:
+        pool = POOLS.get(image)
+        if pool is None:
+            pool = POOLS[image] = ContainerPool(image)
+            metrics.gauge("sandbox_pool_idle", lambda: len(pool.idle), image=image)
+        return pool
+
+
+def _health_loop():
+    while True:
+        time.sleep(POOL_HEALTH_INTERVAL)
+        for pool in list(POOLS.values()):
+            try:
+                pool.health_check()
+            except Exception as e:
+                print(f"WARNING: sandbox health check failed: {e}")
+
+
+def remove_stale_sandboxes():
+    # Containers from a crashed process would otherwise leak forever
+    if not client: return
+    try:
+        for stale in client.containers.list(all=True, filters={'label': POOL_LABEL}):
+            stale.remove(force=True, v=True)
+    except Exception as e:
+        print(f"WARNING: could not clean old sandboxes: {e}")
+
+
+def _docker_languages():
+    if SANDBOX_BACKEND == 'stub':
+        return []
+    if SANDBOX_BACKEND == 'process':
+        return ['c']  # Python runs in worker processes instead
+    return list(IMAGE_SPECS)
+
+
+def prepare_sandbox_images(pull=IMAGE_PULL):
+    """Called once at startup, before warm_pools: resolve, pin and build every sandbox image.
+
+    Worker processes pass pull=False; the parent has already fetched
+    everything, they only look the pinned images up.
+    """
+    if not client: return
+    specs = {language: IMAGE_SPECS[language] for language in _docker_languages()}
+    SANDBOX_IMAGES.update(ImageResolver(client, pull=pull).prepare(specs))
+
+
+def warm_pools(clean=True):
+    """Called once at startup: clear leftovers from a previous run and pre-start containers.
+
+    Worker processes pass clean=False; the parent already cleaned up and
+    they must not remove each other's containers. Sets sandbox_ready when
+    every language has a prepared image and a warm pool.
+    """
+    process_ok = True
+    if SANDBOX_BACKEND == 'process':
+        # Fail closed: without working isolation no Python submission runs at all
+        try:
+            process_pool.check()
+            process_pool.fill()
+        except SandboxUnavailable as e:
+            print(f"🛑 PROCESS SANDBOX UNAVAILABLE, Python submissions are refused: {e}")
+            process_ok = False
+
+    if client:
+        if clean:
+            remove_stale_sandboxes()
+        for image in SANDBOX_IMAGES.values():
+            get_pool(image).fill()
+        threading.Thread(target=_health_loop, daemon=True).start()
+
+    missing = [language for language in _docker_languages() if language not in SANDBOX_IMAGES]
+    if missing:
+        print(f"WARNING: sandbox not ready, no image for: {', '.join(missing)}")
+        return
+    if process_ok:
+        sandbox_ready.set()
+
+
+def readiness():
+    """Status for /ready."""
+    return {
+        "ready": sandbox_ready.is_set(),
+        "backend": SANDBOX_BACKEND,
+        "images": dict(SANDBOX_IMAGES),
+        "warm": {image: len(pool.idle) for image, pool in list(POOLS.items())},
+        "running": manager.running,
+        "waiting": manager.waiting,
+    }
+
+
+@atexit.register
+def shutdown_pools():
+    for pool in list(POOLS.values()):
+        pool.shutdown()
+    process_pool.shutdown()
+
+
+def _batch_error(inputs, message, status="error"):
+    return [{"input": val, "output": message, "status": status, "exit_code": None,
+             "time_ms": None, "cpu_ms": None, "memory_kb": None}
+            for val in inputs]
+
+
+def _parse_batch(inputs, stdout, stderr, overflowed=False):
+    """Turn the harness' JSON lines into one result dict per input.
+
+    With `overflowed` the output was cut off at the read cap, so inputs
+    without a result line are output-limit failures, not crashes.
+    """
+    results = []
+    for line in stdout.splitlines():
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue  # stray output, e.g. the user printed to the real stdout
+        if isinstance(row, dict) and "exit_code" in row:
+            results.append(row)
+
+    parsed = []
+    for i, val in enumerate(inputs):
+        if i < len(results):
+            row = results[i]
+            if row.get("timed_out"):
+                status = "timeout"
+            elif row.get("output_limit"):
+                status = "output_limit"
+            else:
+                status = "ok" if row["exit_code"] == 0 else "runtime_error"
+            parsed.append({
+                "input": val,
+                "output": str(row.get("output", "")).strip(),
+                "status": status,
+                "exit_code": row["exit_code"],
+                "time_ms": row.get("time_ms"),
+                "cpu_ms": row.get("cpu_ms"),
+                "memory_kb": row.get("memory_kb")
+            })
+        elif overflowed:
+            parsed.append({
+                "input": val,
+                "output": "Output Limit Exceeded",
+                "status": "output_limit",
+                "exit_code": None,
+                "time_ms": None,
+                "cpu_ms": None,
+                "memory_kb": None
+            })
+        else:
+            # The harness died before reaching this input (syntax error, os._exit, ...)
+            parsed.append({
+                "input": val,
+                "output": stderr[:OUTPUT_LIMIT_BYTES].strip() or "Error: no output",
+                "status": "runtime_error",
+                "exit_code": None,
+                "time_ms": None,
+                "cpu_ms": None,
+                "memory_kb": None
+            })
+    return parsed
+
+
+class ExecOutput:
+    """What a capped exec read back. exit_code is None if we stopped reading early."""
+
+    def __init__(self):
+        self.exit_code = None
+        self.stdout = bytearray()
+        self.stderr = bytearray()
+        self.overflowed = False
+
+
+def _exec_capped(member, cmd, timeout, max_bytes):
+    """Runs `cmd` in the member, streaming its output into buffers of at most max_bytes each.
+
+    Stops reading as soon as either stream passes the cap (`overflowed`);
+    the process is still running then, so the caller must recycle the
+    member. Raises TimeoutError when `cmd` runs longer than `timeout`.
+    """
+    outcome = ExecOutput()
+    errors = []
+
+    def target():
+        try:
+            exec_id = client.api.exec_create(member.container.id, cmd, stdout=True, stderr=True)['Id']
+            for out, err in client.api.exec_start(exec_id, stream=True, demux=True):
+                for buf, chunk in ((outcome.stdout, out), (outcome.stderr, err)):
+                    if chunk:
+                        room = max_bytes - len(buf)
+                        buf += chunk[:room]
+                        if len(chunk) > room:
+                            outcome.overflowed = True
+                if outcome.overflowed:
+                    return
+            outcome.exit_code = client.api.exec_inspect(exec_id)['ExitCode']
+        except Exception as e:
+            errors.append(e)
+
+    runner = threading.Thread(target=target, daemon=True)
+    runner.start()
+    runner.join(timeout)
+    if runner.is_alive():
+        # Killing the container also ends the blocked exec call
+        raise TimeoutError(f"sandbox run exceeded {timeout}s")
+    if errors:
+        raise errors[0]
+    return outcome
+
+
+def _batch_output_limit(inputs):
+    # One result line per input: the capped output JSON-escaped (at worst 6 bytes per byte) plus the other fields
+    return len(inputs) * (6 * OUTPUT_LIMIT_BYTES + 512)
+
+
+def _tar_files(files):
+    """In-memory tar of {name: (bytes, mode)}, for container.put_archive."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as tar:
+        for name, (data, mode) in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = mode
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _read_file(member, path):
+    """Pulls one file out of a container through get_archive, without touching host disk."""
+    stream, _ = member.container.get_archive(path)
+    with tarfile.open(fileobj=io.BytesIO(b"".join(stream))) as tar:
+        return tar.extractfile(tar.getmembers()[0]).read()
+
+
+def _decode(data):
+    return (data or b"").decode('utf-8', errors='replace')
+
+
+def run_batch(user_code, inputs, language='python', c_mode='int'):
+    """Run the user code against every input in a single sandbox execution.
+
+    Returns one dict per input with `input`, `output` (stripped text),
+    `status` ('ok', 'runtime_error', 'timeout', 'compile_error' or 'error'),
+    `exit_code`, `time_ms`, `cpu_ms` and `memory_kb` (peak RSS). For C the
+    source is compiled once for the whole batch. Each input gets
+    TEST_TIME_LIMIT_MS and the whole batch SUBMISSION_TIME_LIMIT seconds.
+    """
+    inputs = list(inputs)
+
+    if SANDBOX_BACKEND == 'stub':
+        with metrics.span(PHASE_METRIC, phase="run", image="stub"):
+            time.sleep(SANDBOX_STUB_MS / 1000)
+        return [{"input": val, "output": "0", "status": "ok", "exit_code": 0,
+                 "time_ms": 0.0, "cpu_ms": 0.0, "memory_kb": 0} for val in inputs]
+
+    # Fast path: Python in a pre-forked worker process, same harness and output format
+    if language == 'python' and SANDBOX_BACKEND == 'process':
+        try:
+            with metrics.span(PHASE_METRIC, phase="run", image="process"):
+                full_code = f"_script, _source = 'script.py', {user_code!r}\n" + PYTHON_HARNESS
+                stdout, stderr, overflowed = process_pool.run(full_code, inputs, TEST_TIME_LIMIT_MS,
+                                                              OUTPUT_LIMIT_BYTES, _batch_output_limit(inputs),
+                                                              timeout=SUBMISSION_TIME_LIMIT)
+        except TimeoutError:
+            return _batch_error(inputs, "Time Limit Exceeded", status="timeout")
+        except SandboxUnavailable as e:
+            print(f"🛑 PROCESS SANDBOX FAILURE: {e}")
+            return _batch_error(inputs, "Error: Python sandbox unavailable")
+        return _parse_batch(inputs, stdout, stderr, overflowed=overflowed)
+
+    if not client: return _batch_error(inputs, "Error: Docker client not initialized")
+
+    # Submits that arrive during startup wait (a bit) for the images to be ready
+    if language in IMAGE_SPECS and language not in SANDBOX_IMAGES:
+        sandbox_ready.wait(POOL_ACQUIRE_TIMEOUT)
+        if language not in SANDBOX_IMAGES:
+            return _batch_error(inputs, "Error: Sandbox is still starting, try again shortly")
+
+    # 1. SETUP COMMANDS & CODE (the harness is baked into the image)
     if language == 'python':
-        image = "python:3.9-slim"
+        image = SANDBOX_IMAGES['python']
         filename = "script.py"
-        # We use 'sh -c' to pipe the input file into the script
-        run_cmd = "sh -c 'python /app/script.py < /app/input.txt'"
-        full_code = user_code + "\n\n" + PYTHON_HARNESS
+        compile_cmd = None
+        run_cmd = f"sh -c 'python {HARNESS_DIR}/run.py {TEST_TIME_LIMIT_MS} {OUTPUT_LIMIT_BYTES} /app/script.py < /app/input.txt'"
+        full_code = user_code
     
     elif language == 'c':
-        image = "gcc:latest" 
+        image = SANDBOX_IMAGES['c']
         filename = "script.c"
-        # Compile, then run with input piping
-        run_cmd = "sh -c 'gcc /app/script.c -o /app/run -lm && /app/run < /app/input.txt'"
+        compile_cmd = "gcc /app/script.c -o /app/run -lm"
+        run_cmd = f"sh -c '/app/run {TEST_TIME_LIMIT_MS} {OUTPUT_LIMIT_BYTES} < /app/input.txt'"
         
         # Add common defines for compatibility
         header = "#include <stdio.h>\n#include <math.h>\n#include <stdbool.h>\n#define TRUE 1\n#define FALSE 0\n#define True 1\n#define False 0\n"
 
-        if c_mode == 'void':
-            full_code = header + user_code + "\n\n" + C_HARNESS_VOID
-        else:
-            full_code = header + user_code + "\n\n" + C_HARNESS_INT
+        harness = "harness_void.h" if c_mode == 'void' else "harness_int.h"
+        full_code = header + user_code + f'\n\n#include "{HARNESS_DIR}/{harness}"\n'
 
     else:
-        return "Error: Unsupported Language"
+        return _batch_error(inputs, "Error: Unsupported Language")
 
-    # 2. CREATE TEMP FILES (Code AND Input)
-    # File A: The Code
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=filename) as temp_script:
-        temp_script.write(full_code)
-        script_path = temp_script.name
+    # Same source + compiler = same binary, so reuse earlier builds (and errors)
+    build_key, cached_build = None, None
+    if compile_cmd:
+        build_key = cache_key(image, compile_cmd, full_code)
+        cached_build = compile_cache.get(build_key)
+        if cached_build and cached_build[0] == 'error':
+            return _batch_error(inputs, cached_build[1], status="compile_error")
 
-    # File B: The Input
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as temp_input:
-        temp_input.write(str(input_val) + "\n") # Ensure newline!
-        input_path = temp_input.name
+    # Wait our turn when the host is busy, rather than piling onto dockerd
+    try:
+        manager.admit()
+    except TimeoutError as e:
+        return _batch_error(inputs, f"Error: {e}")
 
-    # 3. FIX PERMISSIONS (Crucial for Ubuntu)
-    os.chmod(script_path, 0o644)
-    os.chmod(input_path, 0o644)
+    pool = get_pool(image)
+    try:
+        with metrics.span(PHASE_METRIC, phase="acquire", image=image):
+            member = pool.acquire()
+    except Exception as e:
+        manager.leave()
+        print(f"🛑 DOCKER FAILURE: {e}")
+        return _batch_error(inputs, f"Error: {str(e)}")
 
+    broken = False
     try:
-        # Pull image if missing
-        try:
-            client.images.get(image)
-        except docker.errors.ImageNotFound:
-            print(f"Downloading {image}...")
-            client.images.pull(image)
-
-        # 4. RUN CONTAINER
-        # We mount BOTH the script and the input file
-        container = client.containers.run(
-            image=image,
-            command=run_cmd,
-            volumes={
-                script_path: {'bind': f'/app/{filename}', 'mode': 'ro'},
-                input_path:  {'bind': '/app/input.txt',  'mode': 'ro'}
-            },
-            mem_limit="128m",
-            network_disabled=True,
-            remove=True,     # Auto-delete container when done
-            stdout=True, 
-            stderr=True
-        )
-
-        return container.decode('utf-8').strip()
+        # 2. STREAM CODE, ALL INPUTS (AND A CACHED BINARY) INTO /app
+        files = {
+            filename: (full_code.encode('utf-8'), 0o644),
+            'input.txt': ("".join(f"{val}\n" for val in inputs).encode('utf-8'), 0o644)
+        }
+        if cached_build:
+            files['run'] = (cached_build[1], 0o755)
+        with metrics.span(PHASE_METRIC, phase="upload", image=image):
+            member.container.put_archive('/app', _tar_files(files))
+
+        # 3. COMPILE ONCE (C only), unless the binary came from the cache
+        if compile_cmd and not cached_build:
+            with metrics.span(PHASE_METRIC, phase="compile", image=image):
+                result = _exec_capped(member, compile_cmd, COMPILE_TIME_LIMIT, OUTPUT_LIMIT_BYTES)
+            if result.overflowed:
+                broken = True  # gcc may still be writing errors in there
+            message = _decode(result.stdout + result.stderr).strip()
+            if result.overflowed:
+                # We stopped reading, so we don't know how gcc ended: report it, but don't remember it
+                # ('error' also keeps it out of the verdict cache)
+                return _batch_error(inputs, message + "\n... (compiler output truncated)")
+            if result.exit_code is None or result.exit_code >= 128:
+                # Killed (out of memory under load, ...), not a verdict on the code
+                broken = True
+                return _batch_error(inputs, f"Error: compiler was killed (exit {result.exit_code}), try again")
+            if result.exit_code != 0:
+                # Only real gcc failures (exit 1-127) are cached
+                compile_cache.put_error(build_key, message)
+                return _batch_error(inputs, message, status="compile_error")
+            compile_cache.put_binary(build_key, _read_file(member, '/app/run'))
+
+        # 4. RUN EVERY INPUT INSIDE THE WARM CONTAINER
+        with metrics.span(PHASE_METRIC, phase="run", image=image):
+            result = _exec_capped(member, run_cmd, SUBMISSION_TIME_LIMIT, _batch_output_limit(inputs))
+        if result.overflowed:
+            broken = True  # stopped reading with the program still running, throw the container away
+        return _parse_batch(inputs, _decode(result.stdout), _decode(result.stderr), overflowed=result.overflowed)
+
+    except TimeoutError:
+        # Something is still running in there, throw the container away
+        broken = True
+        return _batch_error(inputs, "Time Limit Exceeded", status="timeout")
 
     except Exception as e:
+        broken = True
         print(f"🛑 DOCKER FAILURE: {e}")
-        return f"Error: {str(e)}"
-    
+        return _batch_error(inputs, f"Error: {str(e)}")
+
     finally:
-        # Cleanup both temp files
-        if os.path.exists(script_path): os.remove(script_path)
-        if os.path.exists(input_path):  os.remove(input_path)
\ No newline at end of file
+        pool.release(member, broken=broken)
+        manager.leave()
+
+
+def run_docker(user_code, input_val, language='python', c_mode='int'):
+    """Single-input convenience wrapper around run_batch, returns the output text."""
+    return run_batch(user_code, [input_val], language, c_mode=c_mode)[0]["output"]
@@ -8,4 +8,8 @@ const api = axios.create({
   }
 })
 
+// Server-Sent Events stream for event status (served on its own port, see backend/events.py)
+export const EVENTS_URL = import.meta.env.VITE_EVENTS_URL ||
+  api.defaults.baseURL.trim().replace(/:\d+\/?$/, '') + ':5001/events'
+
 export default api
\ No newline at end of file
@@ -1,184 +1,504 @@
 """
-Concurrent HTTP connection stress‑tester that also monitors system load.
+Load-testing and benchmark suite for the Blackbox backend.
 
 Features
 --------
-  • Spawns a thread per virtual user.
-  • Each user sends 3 quick probes + a heavy submit in a loop.
-  • Stops when latency > MAX_LATENCY or when MAX_ERRORS are hit.
-  • Live CPU & RAM usage is printed every second.
+  • Scenario DSL: weighted mixes of probe / submit / status / ... actions per
+    question and language (see SCENARIOS and parse_scenario below).
+  • Two arrival models:
+      closed - N virtual users, each doing one action after another with a
+               random think time (like real participants).
+      open   - actions arrive at a fixed average rate (Poisson), no matter how
+               slow the server gets. Latency is measured from the scheduled
+               start, so a backed-up server can't hide its queueing delay.
+  • p50 / p95 / p99 / max per endpoint, throughput, errors and rejections
+    (403 out of probes, 429 judge busy) counted separately.
+  • --json / --csv output for comparing runs; --seed makes the action mix repeatable.
+  • --stub starts its own backend with the stub sandbox (no Docker) on a spare
+    port and a throwaway DB, to measure backend overhead alone.
+  • Live CPU & RAM usage while running (if psutil is installed).
+
+Examples
+--------
+  python machinetest.py --users 50 --duration 60
+  python machinetest.py --model open --rate 200 --scenario "probe:q1*8, submit:q1:python, status*20"
+  python machinetest.py --stub --scenario submit-mix --json run.json --csv run.csv
 """
 
 import argparse
+import csv
+import json
+import math
+import os
 import random
-import time
+import shutil
+import subprocess
+import sys
+import tempfile
 import threading
-from typing import List
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
 
-import psutil
 import requests
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 # --------------------------------------------------------------------------- #
 # DEFAULT SETTINGS – can be overridden via CLI
 # --------------------------------------------------------------------------- #
 SERVER_URL = "http://127.0.0.1:5000"
-RAMP_UP_INTERVAL = 2           # seconds between new users
-MAX_LATENCY_SEC = 5.0
-MAX_ERRORS = 3
-PROBE_COUNT = 3
-PROBE_SLEEP_RANGE = (1, 3)
-SUBMIT_SLEEP_RANGE = (5, 10)
-CODE = "def solve(n): return n"
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+REQUEST_TIMEOUT = 30
+SUBMIT_WAIT = 10  # long-poll seconds per /submit/status call
+
+# Scenario DSL: comma separated "action[:q<id>][:<language>][*<weight>]".
+# Actions: probe, submit, status, questions, progress, leaderboard.
+# Question defaults to 1, language to python, weight to 1.
+SCENARIOS = {
+    "default": "probe:q1*3, submit:q1:python",
+    "probe-heavy": "probe:q1*5, probe:q3*5, probe:q6*5, status*10, progress:q1*2",
+    "submit-mix": "submit:q1:python*3, submit:q2:python*2, submit:q5:c*2, submit:q3:c, probe:q1*4",
+    "polling": "status*20, questions*2, leaderboard*2",
+    "event": "probe:q1*6, probe:q4*4, submit:q1:python*2, submit:q4:c, status*15, progress:q1*2, leaderboard",
+}
+
+# Code sent for submits, per language (a scenario file can override it per question)
+DEFAULT_CODE = {
+    "python": "def solve(n):\n    return n\n",
+    "c": "int solve(int n) {\n    return n;\n}\n",
+}
+
+ACTIONS = ("probe", "submit", "status", "questions", "progress", "leaderboard")
 
 # --------------------------------------------------------------------------- #
-# GLOBAL METRICS (guarded by a lock)
+# SCENARIOS
 # --------------------------------------------------------------------------- #
-lock = threading.Lock()
-active_users = 0
-running = True
-error_count = 0
-latency_history: List[float] = []
+@dataclass
+class Action:
+    kind: str
+    question: int = 1
+    language: str = "python"
+    weight: float = 1.0
+
+    def label(self) -> str:
+        return f"{self.kind}:q{self.question}:{self.language}" if self.kind == "submit" else self.kind
+
+
+def parse_scenario(text: str):
+    """Returns (actions, code overrides) for a built-in name, a DSL string or @file.json.
+
+    A scenario file looks like {"mix": "<DSL string>", "code": {"1:python": "def solve(n): ..."}}.
+    """
+    code: Dict[str, str] = {}
+    text = SCENARIOS.get(text, text)
+    if text.startswith("@"):
+        with open(text[1:]) as f:
+            data = json.load(f)
+        code = data.get("code", {})
+        text = SCENARIOS.get(data["mix"], data["mix"])
+
+    actions = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        spec, _, weight = item.partition("*")
+        kind, *options = spec.strip().split(":")
+        if kind not in ACTIONS:
+            raise ValueError(f"Unknown action '{kind}' in scenario item '{item}'")
+        action = Action(kind, weight=float(weight) if weight else 1.0)
+        for option in options:
+            if option.startswith("q") and option[1:].isdigit():
+                action.question = int(option[1:])
+            elif option in DEFAULT_CODE:
+                action.language = option
+            else:
+                raise ValueError(f"Unknown option '{option}' in scenario item '{item}'")
+        actions.append(action)
+
+    if not actions:
+        raise ValueError("Scenario has no actions")
+    return actions, code
 
 # --------------------------------------------------------------------------- #
-# USER BOT
+# RESULTS (guarded by a lock)
 # --------------------------------------------------------------------------- #
-def student_bot(user_id: int) -> None:
-    global running, error_count
-    session = requests.Session()
-    name = f"LoadTester_{user_id}"
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
 
-    try:
-        reg = session.post(f"{SERVER_URL}/register", json={"username": name})
-        reg.raise_for_status()
-        uid = reg.json()["id"]
-    except Exception as exc:
-        with lock:
-            error_count += 1
-        print(f"💀 User {user_id} register failed: {exc}")
-        return
-
-    while running:
-        # 1. fast probes
-        for _ in range(PROBE_COUNT):
-            if not running:
-                break
-            try:
-                session.post(
-                    f"{SERVER_URL}/probe",
-                    json={"user_id": uid, "question_id": 1, "input": str(random.randint(1, 100))},
-                    timeout=2,
-                )
-            except Exception:
-                pass
-            time.sleep(random.uniform(*PROBE_SLEEP_RANGE))
-
-        # 2. heavy submit
-        if not running:
-            break
-        start = time.time()
+
+class Recorder:
+    """Latencies and outcomes per endpoint. Nothing is kept until `start()` (after warm-up)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = defaultdict(int)
+        self.measuring = False
+        self.started_at = None
+        self.total_errors = 0
+
+    def start(self):
+        with self.lock:
+            self.measuring = True
+            self.started_at = time.perf_counter()
+
+    def record(self, endpoint: str, seconds: float, outcome: str = "ok"):
+        with self.lock:
+            if outcome == "error":
+                self.total_errors += 1
+            if not self.measuring:
+                return
+            self.latencies[endpoint].append(seconds)
+            if outcome == "error":
+                self.errors[endpoint] += 1
+            elif outcome == "rejected":
+                self.rejected[endpoint] += 1
+
+    def summary(self, elapsed: float) -> List[dict]:
+        with self.lock:
+            rows = []
+            for endpoint in sorted(self.latencies):
+                values = sorted(self.latencies[endpoint])
+                rows.append({
+                    "endpoint": endpoint,
+                    "count": len(values),
+                    "errors": self.errors[endpoint],
+                    "rejected": self.rejected[endpoint],
+                    "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+                    "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                    "p50_ms": round(percentile(values, 50) * 1000, 2),
+                    "p95_ms": round(percentile(values, 95) * 1000, 2),
+                    "p99_ms": round(percentile(values, 99) * 1000, 2),
+                    "max_ms": round(values[-1] * 1000, 2),
+                })
+            return rows
+
+# --------------------------------------------------------------------------- #
+# VIRTUAL USER
+# --------------------------------------------------------------------------- #
+_local = threading.local()
+
+
+def http() -> requests.Session:
+    # One keep-alive session per thread (sessions aren't thread-safe)
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, name: str, rng: random.Random, recorder: Recorder,
+                 code: Dict[str, str], unique_code: bool):
+        self.base_url = base_url
+        self.name = name
+        self.rng = rng
+        self.recorder = recorder
+        self.code = code
+        self.unique_code = unique_code
+        self.uid = None
+        self.generation = 0  # bumped when we re-register after running out of probes
+        self.etag = None
+        self.submits = 0
+
+    def register(self):
+        name = self.name if not self.generation else f"{self.name}_{self.generation}"
+        start = time.perf_counter()
+        res = http().post(f"{self.base_url}/register", json={"username": name}, timeout=REQUEST_TIMEOUT)
+        self.recorder.record("register", time.perf_counter() - start, "ok" if res.ok else "error")
+        res.raise_for_status()
+        self.uid = res.json()["id"]
+
+    def run(self, action: Action, scheduled: Optional[float] = None):
+        """Does one action. `scheduled` (open loop) is when it should have started."""
+        start = scheduled if scheduled is not None else time.perf_counter()
         try:
-            res = session.post(
-                f"{SERVER_URL}/submit",
-                json={
-                    "user_id": uid,
-                    "question_id": 1,
-                    "code": CODE,
-                    "language": "python",
-                },
-                timeout=20,
-            )
+            getattr(self, f"_{action.kind}")(action, start)
+        except requests.RequestException:
+            self.recorder.record(action.kind, time.perf_counter() - start, "error")
+
+    def _timed(self, endpoint, start, method, path, expected=(200,), rejected=(), **kwargs):
+        res = http().request(method, f"{self.base_url}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+        outcome = "ok" if res.status_code in expected else "rejected" if res.status_code in rejected else "error"
+        self.recorder.record(endpoint, time.perf_counter() - start, outcome)
+        return res
+
+    def _probe(self, action, start):
+        res = self._timed("probe", start, "POST", "/probe", rejected=(403,), json={
+            "user_id": self.uid, "question_id": action.question, "input": str(self.rng.randint(1, 100))})
+        if res.status_code == 403:
+            # Out of probes for this question: continue as a fresh participant
+            self.generation += 1
+            self.register()
+
+    def _submit(self, action, start):
+        code = self.code.get(f"{action.question}:{action.language}", DEFAULT_CODE[action.language])
+        if self.unique_code:
+            # Defeat the server's verdict cache so every submit really runs
+            self.submits += 1
+            comment = "#" if action.language == "python" else "//"
+            code += f"\n{comment} {self.name} {self.submits}\n"
+
+        res = self._timed("submit", start, "POST", "/submit", expected=(200, 202), rejected=(429,), json={
+            "user_id": self.uid, "question_id": action.question, "code": code, "language": action.language})
+        if res.status_code == 200:  # older, synchronous backend
+            self.recorder.record(f"submit_e2e:{action.language}", time.perf_counter() - start)
+            return
+        if res.status_code != 202:
+            return
+
+        job_id = res.json()["job_id"]
+        while True:
+            status = http().get(f"{self.base_url}/submit/status/{job_id}", params={"wait": SUBMIT_WAIT},
+                                timeout=REQUEST_TIMEOUT + SUBMIT_WAIT)
+            data = status.json() if status.ok else {}
+            if not status.ok or data.get("status") in ("done", "failed"):
+                outcome = "ok" if data.get("status") == "done" else "error"
+                self.recorder.record(f"submit_e2e:{action.language}", time.perf_counter() - start, outcome)
+                return
+
+    def _status(self, action, start):
+        # Like the browser: revalidate with the last ETag
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        res = self._timed("status", start, "GET", "/event/status", expected=(200, 304),
+                          params={"user_id": self.uid}, headers=headers)
+        self.etag = res.headers.get("ETag", self.etag)
+
+    def _questions(self, action, start):
+        self._timed("questions", start, "GET", "/questions")
+
+    def _progress(self, action, start):
+        self._timed("progress", start, "POST", "/get_progress",
+                    json={"user_id": self.uid, "question_id": action.question})
+
+    def _leaderboard(self, action, start):
+        self._timed("leaderboard", start, "GET", "/leaderboard", params={"limit": 10, "user_id": self.uid})
+
+# --------------------------------------------------------------------------- #
+# ARRIVAL MODELS
+# --------------------------------------------------------------------------- #
+def closed_loop(users: List[VirtualUser], actions: List[Action], stop: threading.Event,
+                think_sec: float, ramp_sec: float):
+    weights = [a.weight for a in actions]
+
+    def loop(user: VirtualUser):
+        try:
+            user.register()
         except requests.RequestException as exc:
-            with lock:
-                error_count += 1
-            print(f"❌ User {user_id} submit exception: {exc}")
-            if error_count >= MAX_ERRORS:
-                running = False
+            print(f"💀 {user.name} register failed: {exc}")
+            return
+        while not stop.is_set():
+            user.run(user.rng.choices(actions, weights)[0])
+            if think_sec > 0:
+                stop.wait(user.rng.expovariate(1 / think_sec))
+
+    threads = []
+    for user in users:
+        if stop.is_set():
+            break
+        t = threading.Thread(target=loop, args=(user,), daemon=True)
+        t.start()
+        threads.append(t)
+        if ramp_sec:
+            stop.wait(ramp_sec)
+    return threads
+
+
+def open_loop(users: List[VirtualUser], actions: List[Action], stop: threading.Event,
+              rate: float, max_inflight: int, rng: random.Random, recorder: Recorder):
+    weights = [a.weight for a in actions]
+    for user in users:
+        user.register()
+
+    inflight = threading.Semaphore(max_inflight)
+    pool = ThreadPoolExecutor(max_workers=max_inflight)
+
+    def task(user, action, scheduled):
+        try:
+            user.run(action, scheduled)
+        finally:
+            inflight.release()
+
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        next_at += rng.expovariate(rate)
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            stop.wait(delay)
+        if not inflight.acquire(blocking=False):
+            # Client side saturated: count it instead of silently slowing the arrival rate
+            recorder.record("dropped", 0.0, "error")
             continue
+        pool.submit(task, rng.choice(users), rng.choices(actions, weights)[0], next_at)
+    pool.shutdown(wait=True, cancel_futures=True)
 
-        duration = time.time() - start
+# --------------------------------------------------------------------------- #
+# STUB BACKEND (no Docker)
+# --------------------------------------------------------------------------- #
+def start_stub_backend(port: int, stub_ms: float):
+    workdir = tempfile.mkdtemp(prefix="blackbox-bench-")
+    env = dict(os.environ,
+               SANDBOX_BACKEND="stub", SANDBOX_STUB_MS=str(stub_ms), PORT=str(port), EVENTS_PORT="0",
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
 
-        if res.status_code == 200:
-            with lock:
-                latency_history.append(duration)
-            if duration > MAX_LATENCY_SEC:
-                print(f"⚠️ High latency ({duration:.2f}s) – stopping.")
-                running = False
-        else:
-            with lock:
-                error_count += 1
-            print(f"❌ User {user_id} submit error {res.status_code}")
-            if error_count >= MAX_ERRORS:
-                print("⚠️ Too many errors – stopping.")
-                running = False
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            break
+        try:
+            if requests.get(f"{url}/questions", timeout=1).ok:
+                print(f"🧪 Stub backend up on {url} (log: {log.name})")
+                return server, url, workdir
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit(f"🛑 Stub backend did not start, see {log.name}")
 
-        time.sleep(random.uniform(*SUBMIT_SLEEP_RANGE))
+
+def stop_stub_backend(server, workdir):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+    shutil.rmtree(workdir, ignore_errors=True)
 
 # --------------------------------------------------------------------------- #
 # CPU & RAM monitor
 # --------------------------------------------------------------------------- #
-def monitor_system(interval=1):
-    while running:
-        cpu = psutil.cpu_percent()
-        mem = psutil.virtual_memory().percent
-        with lock:
-            print(f"[CPU:{cpu:3d}%  MEM:{mem:3d}%  USERS:{active_users:3d} ERR:{error_count:2d}]", end="\r")
-        time.sleep(interval)
+def monitor(recorder: Recorder, stop: threading.Event, interval=1):
+    while not stop.wait(interval):
+        with recorder.lock:
+            done = sum(len(v) for v in recorder.latencies.values())
+            errors = recorder.total_errors
+        load = f"CPU:{psutil.cpu_percent():5.1f}%  MEM:{psutil.virtual_memory().percent:5.1f}%  " if psutil else ""
+        print(f"[{load}REQ:{done:7d}  ERR:{errors:4d}]", end="\r")
+
+# --------------------------------------------------------------------------- #
+# OUTPUT
+# --------------------------------------------------------------------------- #
+def print_table(rows: List[dict], elapsed: float):
+    print("\n" + "=" * 96)
+    print(f"📊 RESULTS over {elapsed:.1f}s")
+    print(f"{'endpoint':<22}{'count':>8}{'err':>6}{'rej':>6}{'rps':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for r in rows:
+        print(f"{r['endpoint']:<22}{r['count']:>8}{r['errors']:>6}{r['rejected']:>6}{r['rps']:>9.1f}"
+              f"{r['mean_ms']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+    print("(latencies in ms)")
+    print("=" * 96)
+
+
+def write_outputs(args, actions, rows, elapsed):
+    if args.json:
+        report = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {k: v for k, v in vars(args).items() if k not in ("json", "csv")},
+            "scenario": [vars(a) for a in actions],
+            "elapsed_sec": round(elapsed, 3),
+            "endpoints": rows,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 JSON written to {args.json}")
+    if args.csv and rows:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"💾 CSV written to {args.csv}")
 
 # --------------------------------------------------------------------------- #
 # MAIN CONTROLLER
 # --------------------------------------------------------------------------- #
 def main() -> None:
-    global active_users, running, SERVER_URL, RAMP_UP_INTERVAL, MAX_LATENCY_SEC, MAX_ERRORS
-
-    parser = argparse.ArgumentParser(description="Concurrent HTTP connection tester")
-    parser.add_argument("--url", default=SERVER_URL, help="Base URL of the target webapp")
-    parser.add_argument("--ramp", type=float, default=RAMP_UP_INTERVAL,
-                        help="seconds between new users")
-    parser.add_argument("--latency", type=float, default=MAX_LATENCY_SEC,
-                        help="max acceptable submit time (s)")
-    parser.add_argument("--max-errors", type=int, default=MAX_ERRORS,
-                        help="error threshold")
-    parser.add_argument("--duration", type=int, default=0,
-                        help="Optional total test duration (seconds)")
+    parser = argparse.ArgumentParser(description="Blackbox load tester / benchmark")
+    parser.add_argument("--url", default=SERVER_URL, help="Base URL of the backend")
+    parser.add_argument("--scenario", default="default",
+                        help=f"built-in ({', '.join(SCENARIOS)}), a DSL string or @file.json")
+    parser.add_argument("--model", choices=("closed", "open"), default="closed", help="arrival model")
+    parser.add_argument("--users", type=int, default=20, help="virtual users (open loop: user pool size)")
+    parser.add_argument("--think", type=float, default=1.0, help="closed loop: mean think time between actions (s)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="closed loop: seconds between starting users")
+    parser.add_argument("--rate", type=float, default=50.0, help="open loop: arrivals per second")
+    parser.add_argument("--max-inflight", type=int, default=256, help="open loop: concurrent requests cap")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds before measuring starts")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the action mix")
+    parser.add_argument("--unique-code", action="store_true", help="make every submit unique (no verdict-cache hits)")
+    parser.add_argument("--max-errors", type=int, default=0, help="abort after this many errors (0 = never)")
+    parser.add_argument("--stub", action="store_true", help="start a local backend with the stub sandbox")
+    parser.add_argument("--stub-port", type=int, default=5055)
+    parser.add_argument("--stub-ms", type=float, default=0.0, help="simulated sandbox time per submit (ms)")
+    parser.add_argument("--json", help="write results as JSON to this file")
+    parser.add_argument("--csv", help="write per-endpoint results as CSV to this file")
     args = parser.parse_args()
 
-    # override defaults
-    SERVER_URL = args.url
-    RAMP_UP_INTERVAL = args.ramp
-    MAX_LATENCY_SEC = args.latency
-    MAX_ERRORS = args.max_errors
+    actions, code = parse_scenario(args.scenario)
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    stop = threading.Event()
+
+    server = workdir = None
+    base_url = args.url
+    if args.stub:
+        server, base_url, workdir = start_stub_backend(args.stub_port, args.stub_ms)
+
+    run_tag = f"bench{args.seed}_{int(time.time())}"
+    users = [VirtualUser(base_url, f"{run_tag}_{i}", random.Random(args.seed * 100003 + i), recorder,
+                         code, args.unique_code)
+             for i in range(args.users)]
 
-    # start resource monitor
-    monitor_thr = threading.Thread(target=monitor_system, daemon=True)
-    monitor_thr.start()
+    print(f"🚀 {args.model}-loop, {args.users} users, scenario: {', '.join(a.label() for a in actions)}")
+    threading.Thread(target=monitor, args=(recorder, stop), daemon=True).start()
 
-    threads: List[threading.Thread] = []
+    if args.model == "closed":
+        driver = threading.Thread(target=closed_loop, args=(users, actions, stop, args.think, args.ramp), daemon=True)
+    else:
+        driver = threading.Thread(target=open_loop, daemon=True,
+                                  args=(users, actions, stop, args.rate, args.max_inflight, rng, recorder))
+
+    start_time = time.perf_counter()
+    elapsed = 0.0
     try:
-        while running and error_count < MAX_ERRORS:
-            active_users += 1
-            t = threading.Thread(target=student_bot, args=(active_users,), daemon=True)
-            threads.append(t)
-            t.start()
-            time.sleep(RAMP_UP_INTERVAL)
-
-            if args.duration and time.time() - start_time >= args.duration:
+        driver.start()
+        stop.wait(args.warmup)
+        recorder.start()
+        while not stop.is_set():
+            elapsed = time.perf_counter() - recorder.started_at
+            if elapsed >= args.duration:
+                break
+            if args.max_errors and recorder.total_errors >= args.max_errors:
+                print("\n⚠️ Too many errors – stopping.")
                 break
+            stop.wait(0.2)
     except KeyboardInterrupt:
         print("\n🛑 Stopping test (Ctrl+C)")
     finally:
-        running = False
-        for t in threads:
-            t.join(timeout=1)
-
-        print("\n" + "=" * 60)
-        print("📊 MACHINE LIMIT FINDER")
-        print(f"✅ Max stable users: {active_users-1}")
-        if latency_history:
-            avg = sum(latency_history) / len(latency_history)
-            print(f"⏱️ Avg submit time: {avg:.2f}s")
-        print(f"❌ Total errors: {error_count}")
-        print("=" * 60)
+        elapsed = time.perf_counter() - (recorder.started_at or start_time)
+        rows = recorder.summary(elapsed)
+        stop.set()
+        driver.join(timeout=REQUEST_TIMEOUT)
+        if server:
+            stop_stub_backend(server, workdir)
+
+    print_table(rows, elapsed)
+    write_outputs(args, actions, rows, elapsed)
+
 
 if __name__ == "__main__":
-    start_time = time.time()
-    main()
\ No newline at end of file
+    main()